@@ -10,6 +10,7 @@ from django.http import JsonResponse
 from django.shortcuts import render
 from django.urls import path
 
+from .cache_utils import invalidate_user_caches
 from .models import (
     AggregateAnalytics,
     AnonymizedReadingProfile,
@@ -130,6 +131,13 @@ class UserBookAdmin(admin.ModelAdmin):
     list_filter = ("is_top_book", "user_rating")
     search_fields = ("user__username", "book__title", "book__author__name")
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip UserBook.delete(), so invalidate each affected reader once here
+        user_ids = set(queryset.values_list("user_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            invalidate_user_caches(user_id)
+
 
 @admin.register(AnonymousUserSession)
 class AnonymousUserSessionAdmin(admin.ModelAdmin):
@@ -1,4 +1,7 @@
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
 
 from django.core.cache import cache
 
@@ -9,6 +12,12 @@ logger = logging.getLogger(__name__)
 # TTL for the DNA task-flow caches (dna_result_/session_key_/upload_nonce_/task_owner_ keys)
 DNA_CACHE_TTL = 3600
 
+# Per-user version tokens (ubook_ver_{user_id}) are random and never reused, so an evicted or
+# flushed key can't bring an old version back: a missing token always reads as a cache miss.
+
+# Users whose per-row UserBook invalidation is suppressed while a bulk library write runs
+_deferred_invalidation_user_ids = ContextVar("deferred_invalidation_user_ids", default=frozenset())
+
 
 def safe_cache_get(key, default=None):
     """Safely get a value from cache, handling Redis connection errors gracefully."""
@@ -21,12 +30,14 @@ def safe_cache_get(key, default=None):
 
 
 def safe_cache_set(key, value, timeout=None):
-    """Safely set a value in cache, handling Redis connection errors gracefully."""
+    """Safely set a value in cache, handling Redis connection errors gracefully. Returns False on failure."""
     try:
         cache.set(key, value, timeout)
+        return True
     except Exception as e:
         logger.warning(f"Cache set failed for key '{key}': {e}. Continuing without cache.")
         track_redis_cache_error(operation="set", key=key, error_type=type(e).__name__, error_message=str(e))
+        return False
 
 
 def safe_cache_delete(key):
@@ -52,3 +63,99 @@ def safe_cache_add(key, value, timeout=None):
         logger.warning(f"Cache add failed for key '{key}': {e}. Continuing without cache.")
         track_redis_cache_error(operation="add", key=key, error_type=type(e).__name__, error_message=str(e))
         return True
+
+
+def safe_cache_delete_many(keys):
+    """Safely delete several cache keys in one round trip."""
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Cache delete_many failed for {len(keys)} keys: {e}. Continuing without cache.")
+        track_redis_cache_error(operation="delete_many", key=None, error_type=type(e).__name__, error_message=str(e))
+
+
+def safe_cache_get_many(keys):
+    """Safely fetch several cache keys in one round trip. Returns {} on Redis failure."""
+    try:
+        return cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f"Cache get_many failed for {len(keys)} keys: {e}. Continuing without cache.")
+        track_redis_cache_error(operation="get_many", key=None, error_type=type(e).__name__, error_message=str(e))
+        return {}
+
+
+def safe_cache_set_many(mapping, timeout=None):
+    """Safely store several cache keys in one round trip."""
+    try:
+        cache.set_many(mapping, timeout)
+    except Exception as e:
+        logger.warning(f"Cache set_many failed for {len(mapping)} keys: {e}. Continuing without cache.")
+        track_redis_cache_error(operation="set_many", key=None, error_type=type(e).__name__, error_message=str(e))
+
+
+def user_version_key(user_id):
+    return f"ubook_ver_{user_id}"
+
+
+def get_user_versions(user_ids):
+    """Current version tokens for user_ids in one round trip. Users without a stored token are omitted."""
+    user_ids_by_key = {user_version_key(user_id): user_id for user_id in user_ids}
+    found = safe_cache_get_many(list(user_ids_by_key))
+    return {user_ids_by_key[key]: token for key, token in found.items()}
+
+
+def bump_user_version(user_id):
+    """Give the user a fresh version token, staling every cached entry that recorded the old one."""
+    key = user_version_key(user_id)
+    if not safe_cache_set(key, uuid4().hex, None):
+        # A missing token reads as a miss, so dropping the old one still invalidates
+        safe_cache_delete(key)
+
+
+def claim_user_version(user_id):
+    """Store a first version token for a user who has none.
+
+    Returns the token, or None if another worker stored one first; the caller can't
+    tell whether its data predates that write and should skip caching.
+    """
+    token = uuid4().hex
+    return token if safe_cache_add(user_version_key(user_id), token, None) else None
+
+
+def invalidate_user_caches(user_id):
+    """Drop the caches derived from a user's library after it changes.
+
+    Call once per write batch rather than once per UserBook row.
+    """
+    # Lazy import: the similarity service imports this module
+    from .services.user_similarity_service import _similarity_context_cache_key
+
+    safe_cache_delete_many(
+        [
+            f"user_recommendations_{user_id}",
+            f"similar_users_{user_id}",
+            _similarity_context_cache_key(user_id),
+        ]
+    )
+    # Other readers' cached similar-user lists that include this user go stale
+    bump_user_version(user_id)
+
+
+def user_cache_invalidation_deferred(user_id):
+    """True while a deferred_user_cache_invalidation block is open for this user."""
+    return user_id in _deferred_invalidation_user_ids.get()
+
+
+@contextmanager
+def deferred_user_cache_invalidation(user_id):
+    """Batch UserBook writes for one user into a single cache invalidation.
+
+    The per-row post_save handler is skipped for this user inside the block;
+    invalidate_user_caches runs once on exit, even if the block raises.
+    """
+    token = _deferred_invalidation_user_ids.set(_deferred_invalidation_user_ids.get() | {user_id})
+    try:
+        yield
+    finally:
+        _deferred_invalidation_user_ids.reset(token)
+        invalidate_user_caches(user_id)
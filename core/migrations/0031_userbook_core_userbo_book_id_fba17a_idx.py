@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 14:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_userprofile_is_public_default_true'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbook',
+            index=models.Index(fields=['book', 'user'], name='core_userbo_book_id_fba17a_idx'),
+        ),
+    ]
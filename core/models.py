@@ -1,4 +1,5 @@
 import re
+from functools import cached_property
 
 from django.contrib.auth.models import User
 from django.db import models
@@ -115,11 +116,23 @@ class UserBook(models.Model):
         indexes = [
             models.Index(fields=["user", "is_top_book"]),
             models.Index(fields=["book", "is_top_book"]),
+            # Covers the book -> readers lookup that shortlists similar-user candidates
+            models.Index(fields=["book", "user"]),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.book.title}"
 
+    def delete(self, *args, **kwargs):
+        # Single-row deletes invalidate here rather than via post_delete: a post_delete
+        # receiver would disable fast delete for the bulk stale-row cleanup on re-upload.
+        result = super().delete(*args, **kwargs)
+        from .cache_utils import invalidate_user_caches, user_cache_invalidation_deferred
+
+        if not user_cache_invalidation_deferred(self.user_id):
+            invalidate_user_caches(self.user_id)
+        return result
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -183,6 +196,21 @@ class AnonymousUserSession(models.Model):
     def __str__(self):
         return f"Anonymous session: {self.session_key}"
 
+    # Read-only views over the JSON id lists; the recommendation paths probe these once per
+    # candidate user, so build them once per instance. Not reset by refresh_from_db().
+    @cached_property
+    def read_book_ids(self):
+        return frozenset(self.books_data or [])
+
+    @cached_property
+    def top_book_ids(self):
+        return frozenset(self.top_books_data or [])
+
+    @cached_property
+    def rating_by_book_id(self):
+        # JSON round-trips turn the book_id keys into strings; book ids are ints everywhere else
+        return {int(book_id): rating for book_id, rating in (self.book_ratings or {}).items()}
+
 
 class AnonymizedReadingProfile(models.Model):
     """Permanently stored, anonymized reading profile for comparison"""
@@ -246,3 +274,16 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.userprofile.save()
+
+
+@receiver(post_save, sender=UserBook)
+def invalidate_user_recommendation_caches(sender, instance, raw=False, **kwargs):
+    # A single-row library edit makes the cached recs and similar-user list stale immediately;
+    # don't wait out their TTLs. Bulk writers (CSV import, DNA claim) wrap their loops in
+    # deferred_user_cache_invalidation and invalidate once. Lazy import keeps models free of
+    # the cache/analytics chain.
+    from .cache_utils import invalidate_user_caches, user_cache_invalidation_deferred
+
+    if raw or user_cache_invalidation_deferred(instance.user_id):
+        return
+    invalidate_user_caches(instance.user_id)
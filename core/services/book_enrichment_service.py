@@ -17,6 +17,11 @@ logger = logging.getLogger(__name__)
 
 GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
 
+# Everything _fetch_from_open_library reads from a search doc. Asking for just these keeps the
+# response small, and subject/pages usually spare the work call. The doc's isbn and publisher lists
+# mix every edition in no useful order, so both still come from the cover_edition_key edition.
+OPEN_LIBRARY_SEARCH_FIELDS = "key,cover_i,cover_edition_key,subject,first_publish_year,number_of_pages_median"
+
 
 def _redact_api_key(text):
     """Strip the Google Books API key from anything we log or persist.
@@ -112,7 +117,12 @@ def get_book_details_for_seeder(title: str, author: str, session: requests.Sessi
     details = {}
     try:
         search_url = "https://openlibrary.org/search.json"
-        search_params = {"title": _clean_title_for_api(title), "author": author}
+        search_params = {
+            "title": _clean_title_for_api(title),
+            "author": author,
+            "fields": OPEN_LIBRARY_SEARCH_FIELDS,
+            "limit": 1,
+        }
         res_search = session.get(search_url, params=search_params, timeout=10)
         res_search.raise_for_status()
         search_data = res_search.json()
@@ -160,6 +170,14 @@ def _extract_edition_data(edition_data, book_details):
         book_details["isbn_13"] = isbns_10[0]
 
 
+def _extract_search_data(search_result, book_details):
+    """Fill page count and publish year from an OL search doc, where present."""
+    if year := search_result.get("first_publish_year"):
+        book_details["publish_year"] = year
+    if pages := search_result.get("number_of_pages_median"):
+        book_details["page_count"] = int(pages)
+
+
 def _fetch_work_genres(work_key, book_title, session, book_details, slow_down=False, timeout=5):
     """Fetch genres from an OL work endpoint. Returns number of API calls made."""
     work_url = f"https://openlibrary.org{work_key}.json"
@@ -180,7 +198,9 @@ def _fetch_from_open_library(book, session, slow_down=False, quick_mode=False):
     """
     Fetches metadata from Open Library. Uses direct ISBN endpoint when available
     (skips search), then work endpoint for genres, and edition endpoint only if
-    the book is missing page count/publisher/year data.
+    the book is missing page count/publisher/year data. A search hit already
+    carries subjects and most edition fields, so the work and edition endpoints
+    are only called for what the search doc lacks.
 
     quick_mode=True (inline enrichment during DNA calculation) uses reduced
     HTTP timeouts: 5s for search, 4s for work/edition/isbn detail endpoints.
@@ -233,7 +253,12 @@ def _fetch_from_open_library(book, session, slow_down=False, quick_mode=False):
 
         # Fallback: search by title+author
         search_url = "https://openlibrary.org/search.json"
-        search_params = {"title": _clean_title_for_api(book.title), "author": book.author.name}
+        search_params = {
+            "title": _clean_title_for_api(book.title),
+            "author": book.author.name,
+            "fields": OPEN_LIBRARY_SEARCH_FIELDS,
+            "limit": 1,
+        }
         res = session.get(search_url, params=search_params, timeout=search_timeout)
         api_calls += 1
         if slow_down:
@@ -251,15 +276,26 @@ def _fetch_from_open_library(book, session, slow_down=False, quick_mode=False):
         work_key = search_result.get("key")
         edition_key = search_result.get("cover_edition_key")
         book_details["cover_id"] = search_result.get("cover_i")
+        _extract_search_data(search_result, book_details)
 
-        # Fetch genres from work endpoint
-        if work_key:
+        # Genres: the search doc's subjects are the work's, so only fetch the work without them
+        if subjects := search_result.get("subject"):
+            book_details["genres"] = list(_clean_and_canonicalize_genres(subjects))
+        elif work_key:
             api_calls += _fetch_work_genres(
                 work_key, book.title, session, book_details, slow_down, timeout=detail_timeout
             )
 
-        # Skip edition endpoint if book already has all edition data
-        if book.page_count and book.publisher and book.publish_year and book.isbn13:
+        # Skip edition endpoint if the book and the search doc already cover all edition data.
+        # The ISBN and publisher only ever come from the book or the edition, never the search doc
+        if all(
+            (
+                book.page_count or book_details["page_count"],
+                book.publisher or book_details["publisher"],
+                book.publish_year or book_details["publish_year"],
+                book.isbn13 or book_details["isbn_13"],
+            )
+        ):
             logger.debug(f"Skipping OL edition for '{book.title}' — already has page/publisher/year/isbn data")
         elif edition_key:
             edition_url = f"https://openlibrary.org/books/{edition_key}.json"
@@ -16,7 +16,6 @@ import requests
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
 from django.db.models import F
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
 from core.services.llm_service import generate_vibe_with_llm
 
@@ -35,7 +34,7 @@ from ...percentile_engine import (
     calculate_percentiles_from_aggregates,
     update_analytics_from_stats,
 )
-from ..top_books_service import calculate_and_store_top_books
+from ..top_books_service import calculate_and_store_top_books, review_sentiment
 from .csv_parser import (  # noqa: F401 — re-exported for stable import paths
     STORYGRAPH_TO_GOODREADS,
     _detect_and_normalize_csv,
@@ -420,47 +419,50 @@ def calculate_full_dna(csv_file_content: str, user=None, session_key=None, progr
 
         # Store UserBook entries for registered users
         if user and results:
+            from ...cache_utils import deferred_user_cache_invalidation
             from ...models import UserBook
 
             # Collect current book IDs from this upload
             current_book_ids = {book.id for book, genres, original_row in results if book}
 
-            # Delete stale UserBook records from previous uploads that are no longer in the CSV
-            stale_count, _ = UserBook.objects.filter(user=user).exclude(book_id__in=current_book_ids).delete()
-            if stale_count:
-                logger.info(f"Removed {stale_count} stale UserBook records for user {user.id}")
-
-            # Store book data with ratings and reviews - now we have the original row
-            for book, genres, original_row in results:
-                if book:
-                    rating_value = None
-                    review_value = ""
-
-                    if pd.notna(original_row.get("My Rating")) and original_row["My Rating"] > 0:
-                        try:
-                            rating_value = int(original_row["My Rating"])
-                        except (ValueError, TypeError):
-                            rating_value = None
-
-                    if pd.notna(original_row.get("My Review")):
-                        review_value = str(original_row["My Review"]).strip()
-
-                    date_read_value = None
-                    if pd.notna(original_row.get("Date Read")):
-                        date_read_value = pd.to_datetime(original_row["Date Read"], errors="coerce")
-                        if pd.isna(date_read_value):
-                            date_read_value = None
-
-                    # Use update_or_create to handle duplicates better
-                    UserBook.objects.update_or_create(
-                        user=user,
-                        book=book,
-                        defaults={
-                            "user_rating": rating_value,
-                            "user_review": review_value,
-                            "date_read": date_read_value,
-                        },
-                    )
+            # One cache invalidation for the whole rewrite instead of one per UserBook row
+            with deferred_user_cache_invalidation(user.id):
+                # Delete stale UserBook records from previous uploads that are no longer in the CSV
+                stale_count, _ = UserBook.objects.filter(user=user).exclude(book_id__in=current_book_ids).delete()
+                if stale_count:
+                    logger.info(f"Removed {stale_count} stale UserBook records for user {user.id}")
+
+                # Store book data with ratings and reviews - now we have the original row
+                for book, genres, original_row in results:
+                    if book:
+                        rating_value = None
+                        review_value = ""
+
+                        if pd.notna(original_row.get("My Rating")) and original_row["My Rating"] > 0:
+                            try:
+                                rating_value = int(original_row["My Rating"])
+                            except (ValueError, TypeError):
+                                rating_value = None
+
+                        if pd.notna(original_row.get("My Review")):
+                            review_value = str(original_row["My Review"]).strip()
+
+                        date_read_value = None
+                        if pd.notna(original_row.get("Date Read")):
+                            date_read_value = pd.to_datetime(original_row["Date Read"], errors="coerce")
+                            if pd.isna(date_read_value):
+                                date_read_value = None
+
+                        # Use update_or_create to handle duplicates better
+                        UserBook.objects.update_or_create(
+                            user=user,
+                            book=book,
+                            defaults={
+                                "user_rating": rating_value,
+                                "user_review": review_value,
+                                "date_read": date_read_value,
+                            },
+                        )
 
         # Inline enrichment for StoryGraph uploads (DB backfill + Google Books quick lookup)
         if csv_source == "storygraph" and book_pks_by_idx:
@@ -677,9 +679,7 @@ def calculate_full_dna(csv_file_content: str, user=None, session_key=None, progr
         most_positive_review, most_negative_review = None, None
 
         if not reviews_df.empty:
-            analyzer = SentimentIntensityAnalyzer()
-
-            reviews_df["sentiment"] = reviews_df["My Review"].apply(lambda r: analyzer.polarity_scores(r)["compound"])
+            reviews_df["sentiment"] = reviews_df["My Review"].apply(review_sentiment)
 
             pos_candidate = (
                 reviews_df[reviews_df["My Rating"] == 5]
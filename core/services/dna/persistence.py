@@ -1,10 +1,10 @@
+import heapq
 import logging
 
 import pandas as pd
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
 from ...models import Author
-from ..top_books_service import MIN_REVIEW_LENGTH_FOR_SENTIMENT, compute_book_score
+from ..top_books_service import MIN_REVIEW_LENGTH_FOR_SENTIMENT, compute_book_score, review_sentiment
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +35,16 @@ def _save_dna_to_profile(profile, dna_data):
                 "pending_dna_task_id",
                 "recommendations_data",
                 "recommendations_generated_at",
+                # auto_now only fires for listed fields; cached similarity contexts key on it
+                "last_updated",
             ]
         )
 
         # Invalidate stale caches for this user
-        from ...cache_utils import safe_cache_add, safe_cache_delete
+        from ...cache_utils import invalidate_user_caches, safe_cache_add
 
-        safe_cache_delete(f"similar_users_{profile.user.id}")
-        safe_cache_delete(f"user_recommendations_{profile.user.id}")
+        # New DNA also changes how this user scores in everyone else's similar-user lists
+        invalidate_user_caches(profile.user.id)
 
         # Sentinel-guard the dispatch (same guard as display_dna_view) so a
         # dashboard poll landing in the window before the task picks up can't
@@ -78,7 +80,6 @@ def save_anonymous_session_data(session_key, dna_data, user_book_objects, read_d
 
     # Calculate top books for anonymous users based on ratings and reviews
     book_scores = []
-    analyzer = SentimentIntensityAnalyzer()
 
     for idx, row_dict in enumerate(read_df.to_dict("records")):
         if idx < len(user_book_objects) and user_book_objects[idx]:
@@ -96,12 +97,12 @@ def save_anonymous_session_data(session_key, dna_data, user_book_objects, read_d
             sentiment = None
             review = str(row_dict.get("My Review", "")).strip()
             if review and len(review) > MIN_REVIEW_LENGTH_FOR_SENTIMENT:
-                sentiment = analyzer.polarity_scores(review)["compound"]
+                sentiment = review_sentiment(review)
 
             book_scores.append((book.id, compute_book_score(rating_int, sentiment)))
 
-    book_scores.sort(key=lambda x: x[1], reverse=True)
-    top_books_data = [book_id for book_id, score in book_scores[:5]]
+    # Same order as a stable descending sort, without sorting the whole library for five ids
+    top_books_data = [book_id for book_id, score in heapq.nlargest(5, book_scores, key=lambda x: x[1])]
 
     # Extract distributions from DNA
     genre_dist = {}
@@ -1,18 +1,24 @@
+import heapq
 import logging
-import math
 import random
-from collections import Counter
-
-from django.db.models import Q
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Prefetch, Q, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 from ..cache_utils import safe_cache_delete, safe_cache_get, safe_cache_set
 from ..models import AnonymizedReadingProfile, AnonymousUserSession, Author, Book, Genre, User, UserBook
 from .user_similarity_service import (
-    _build_user_context_for_similarity,
-    _bulk_build_user_contexts,
-    calculate_anonymous_similarity_with_context,
-    calculate_similarity_with_anonymized,
+    SIMILARITY_CANDIDATE_FIELDS,
+    _get_cached_user_contexts,
+    _get_user_context_for_similarity,
+    calculate_anonymous_similarities_with_contexts,
+    calculate_similarities_with_anonymized,
     find_similar_users,
     get_match_quality_label,
 )
@@ -22,6 +28,9 @@ logger = logging.getLogger(__name__)
 
 MIN_SIMILARITY = 0.15
 QUALITY_THRESHOLD = 3.5
+# Ranked candidates handed to the diversity filter, as a multiple of the requested limit.
+# Leaves headroom for candidates the filter skips for genre/author saturation.
+DIVERSITY_POOL_MULTIPLIER = 5
 
 # Scoring weights for candidate ranking (see _score_and_rank_candidates)
 RECOMMENDATION_WEIGHTS = {
@@ -34,6 +43,14 @@ RECOMMENDATION_WEIGHTS = {
     "RECOMMENDER_CONFIDENCE": 0.1,  # log-scaled confidence boost per recommender
 }
 
+# Book columns read while scoring, explaining and persisting a candidate. Candidate
+# querysets project onto these so the wide Book rows aren't shipped from Postgres.
+CANDIDATE_BOOK_FIELDS = ("id", "title", "average_rating", "publish_year", "author__id", "author__name")
+
+# Context invariant: _build_user_context and _build_anonymous_context return the id/series
+# collections (read_book_ids, disliked_book_ids, top_books, oversaturated_series) as
+# frozensets. Scoring only probes them for membership, so never substitute a list.
+
 
 def get_recommendations_for_user(user, limit=10):
     """
@@ -54,7 +71,7 @@ def get_recommendations_for_user(user, limit=10):
     candidates = _collect_candidates_for_user(user, user_context, limit)
 
     # Score and rank candidates
-    ranked = _score_and_rank_candidates(candidates, user_context)
+    ranked = _score_and_rank_candidates(candidates, user_context, top_k=limit * DIVERSITY_POOL_MULTIPLIER)
 
     # Apply diversity and filtering
     final_recommendations = _apply_diversity_filter(ranked, user_context, limit)
@@ -93,7 +110,7 @@ def _get_recommendations_for_anonymous_uncached(session_key, limit=10):
                 candidates[book_id] = candidate_data
 
     # Score and rank
-    ranked = _score_and_rank_candidates(candidates, anon_context)
+    ranked = _score_and_rank_candidates(candidates, anon_context, top_k=limit * DIVERSITY_POOL_MULTIPLIER)
 
     # Apply diversity
     final_recommendations = _apply_diversity_filter(ranked, anon_context, limit)
@@ -115,54 +132,106 @@ def get_recommendations_for_anonymous(session_key, limit=10):
     return result
 
 
+def _aggregate_user_genre_weights(user):
+    """
+    Genre preferences summed in the database: one GROUP BY over the user's books instead of
+    loading every book's genres. Per-book weight matches _build_user_context: 5 for a top book,
+    else the user's rating, else 3.
+    """
+    book_weight = Case(
+        When(is_top_book=True, then=Value(5)),
+        When(user_rating__gt=0, then=F("user_rating")),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
+    rows = (
+        UserBook.objects.filter(user=user, book__genres__isnull=False)
+        .values_list("book__genres__name")
+        .annotate(weight=Sum(book_weight))
+        .order_by()
+    )
+    return Counter(dict(rows))
+
+
+def _resolve_currently_reading(currently_reading_books, authors_by_name=None):
+    """
+    Map DNA currently_reading_books entries to (genre names, author ids) for boosting.
+    Authors and books are each resolved in one query with genres prefetched, rather than
+    a lookup per book. With authors_by_name ({normalized_name: Author}), authors are only
+    matched against that already-fetched map.
+    """
+    author_names = set()
+    book_keys = set()
+    for cr_book in currently_reading_books:
+        cr_author = cr_book.get("author", "")
+        if not cr_author:
+            continue
+        normalized_author = Author._normalize(cr_author)
+        author_names.add(normalized_author)
+        cr_title = cr_book.get("title", "")
+        if cr_title:
+            book_keys.add((Book._normalize_title(cr_title), normalized_author))
+
+    if authors_by_name is not None:
+        author_ids = {authors_by_name[name].id for name in author_names if name in authors_by_name}
+    elif author_names:
+        author_ids = set(Author.objects.filter(normalized_name__in=author_names).values_list("id", flat=True))
+    else:
+        author_ids = set()
+
+    genre_names = set()
+    if book_keys:
+        matches = Q()
+        for normalized_title, normalized_author in book_keys:
+            matches |= Q(normalized_title=normalized_title, author__normalized_name=normalized_author)
+        for book in Book.objects.filter(matches).only("id").prefetch_related("genres"):
+            genre_names.update(genre.name for genre in book.genres.all())
+
+    return genre_names, author_ids
+
+
 def _build_user_context(user):
     """Build comprehensive user context for filtering and scoring."""
-    user_books_qs = (
-        UserBook.objects.filter(user=user).select_related("book", "book__author").prefetch_related("book__genres")
+    # Plain tuples streamed in chunks: no model instances, flat memory for large libraries
+    user_book_rows = (
+        UserBook.objects.filter(user=user)
+        .values_list("book_id", "user_rating", "is_top_book", "book__title", "book__author_id")
+        .iterator(chunk_size=2000)
     )
 
-    # Convert to list to avoid multiple queryset evaluations
-    user_books = list(user_books_qs)
-
     read_book_ids = set()
     disliked_book_ids = set()
     top_books = set()
     series_counter = Counter()
-    genre_weights = Counter()
+    genre_weights = _aggregate_user_genre_weights(user)
     author_weights = Counter()
     author_count = Counter()
 
     # Single pass through all user books
-    for ub in user_books:
-        book_id = ub.book.id
+    for book_id, user_rating, is_top_book, title, author_id in user_book_rows:
         read_book_ids.add(book_id)
 
         # Disliked books
-        if ub.user_rating and ub.user_rating <= 2:
+        if user_rating and user_rating <= 2:
             disliked_book_ids.add(book_id)
 
         # Top books
-        if ub.is_top_book:
+        if is_top_book:
             top_books.add(book_id)
 
         # Calculate weight for this book
         weight = 3
-        if ub.user_rating:
-            weight = ub.user_rating
-        if ub.is_top_book:
+        if user_rating:
+            weight = user_rating
+        if is_top_book:
             weight = 5  # Treat a "top book" like a 5-star rating
 
-        # Genre preferences (weighted by rating)
-        for genre in ub.book.genres.all():
-            genre_weights[genre.name] += weight
-
         # Author preferences (weighted by rating)
-        author_id = ub.book.author.id
         author_weights[author_id] += weight
         author_count[author_id] += 1
 
         # Series information
-        series_key = _get_series_key(ub.book.title)
+        series_key = _get_series_key(title)
         if series_key:
             series_counter[series_key] += 1
 
@@ -185,34 +254,16 @@ def _build_user_context(user):
     currently_reading_genres = set()
     currently_reading_authors = set()
     if dna and dna.get("currently_reading_books"):
-        for cr_book in dna["currently_reading_books"]:
-            cr_author = cr_book.get("author", "")
-            cr_title = cr_book.get("title", "")
-            if cr_author:
-                normalized = Author._normalize(cr_author)
-                try:
-                    author_obj = Author.objects.get(normalized_name=normalized)
-                    currently_reading_authors.add(author_obj.id)
-                except Author.DoesNotExist:
-                    pass
-            if cr_title and cr_author:
-                normalized_title = Book._normalize_title(cr_title)
-                normalized_author = Author._normalize(cr_author)
-                try:
-                    book_obj = Book.objects.get(
-                        normalized_title=normalized_title, author__normalized_name=normalized_author
-                    )
-                    for genre in book_obj.genres.all():
-                        currently_reading_genres.add(genre.name)
-                except Book.DoesNotExist:
-                    pass
+        currently_reading_genres, currently_reading_authors = _resolve_currently_reading(
+            dna["currently_reading_books"]
+        )
 
     return {
         "user": user,
-        "read_book_ids": read_book_ids,
-        "disliked_book_ids": disliked_book_ids,
-        "top_books": top_books,
-        "oversaturated_series": oversaturated_series,
+        "read_book_ids": frozenset(read_book_ids),
+        "disliked_book_ids": frozenset(disliked_book_ids),
+        "top_books": frozenset(top_books),
+        "oversaturated_series": frozenset(oversaturated_series),
         "genre_preferences": genre_preferences,
         "author_weights": author_weights,
         "author_saturation": author_saturation,
@@ -225,13 +276,11 @@ def _build_user_context(user):
 
 def _build_anonymous_context(anon_session):
     """Build context for anonymous user"""
-    read_book_ids = set(anon_session.books_data or [])
-    top_books = set(anon_session.top_books_data or [])
-
-    # Use getattr for backwards compatibility if migration hasn't run yet
-    book_ratings = getattr(anon_session, "book_ratings", None) or {}
+    read_book_ids = anon_session.read_book_ids
+    top_books = anon_session.top_book_ids
 
-    disliked_book_ids = {book_id for book_id, rating in book_ratings.items() if rating <= 2}
+    ratings_by_book_id = anon_session.rating_by_book_id
+    disliked_book_ids = frozenset(book_id for book_id, rating in ratings_by_book_id.items() if rating <= 2)
 
     # Get genre preferences from stored distribution
     genre_distribution = anon_session.genre_distribution or {}
@@ -244,12 +293,12 @@ def _build_anonymous_context(anon_session):
 
     # Get series info from read books
     if read_book_ids:
-        read_books = list(Book.objects.filter(id__in=read_book_ids).select_related("author"))
+        read_books = list(Book.objects.filter(id__in=read_book_ids).only("id", "title", "author_id"))
         series_counter = _extract_series_info(read_books)
-        oversaturated_series = {series for series, count in series_counter.items() if count >= 3}
+        oversaturated_series = frozenset(series for series, count in series_counter.items() if count >= 3)
     else:
         read_books = []
-        oversaturated_series = set()
+        oversaturated_series = frozenset()
 
     # Build author_weights from author_distribution (needed for fallback)
     # Weight by ratings if available
@@ -265,33 +314,25 @@ def _build_anonymous_context(anon_session):
         author.normalized_name: author for author in Author.objects.filter(normalized_name__in=normalized_names)
     }
 
-    # Get all read books with authors in one query (reuse read_books if available)
-    if read_book_ids:
-        if read_books:  # Reuse if we already fetched them
-            read_books_with_authors = {book.id: book.author_id for book in read_books}
-        else:
-            read_books_with_authors = {
-                book.id: book.author_id
-                for book in Book.objects.filter(id__in=read_book_ids).select_related("author")
-            }
-    else:
-        read_books_with_authors = {}
+    # read_books already carries author_id; an empty result there would be empty here too
+    read_books_with_authors = {book.id: book.author_id for book in read_books}
+
+    # Invert once so each author's books are a dict lookup rather than a scan of every read book
+    books_by_author_id = defaultdict(list)
+    for book_id, author_id in read_books_with_authors.items():
+        books_by_author_id[author_id].append(book_id)
 
     for normalized_name, count in author_dist.items():
         author = authors_dict.get(normalized_name)
         if not author:
             continue
         # If we have ratings, weight by average rating for this author
-        author_book_ids = [
-            book_id for book_id, author_id in read_books_with_authors.items() if author_id == author.id
+        author_ratings = [
+            ratings_by_book_id[bid] for bid in books_by_author_id.get(author.id, ()) if bid in ratings_by_book_id
         ]
-        if author_book_ids and book_ratings:
-            author_ratings = [book_ratings.get(bid, 3) for bid in author_book_ids if bid in book_ratings]
-            if author_ratings:
-                avg_rating = sum(author_ratings) / len(author_ratings)
-                author_weights[author.id] = count * (avg_rating / 5.0)  # Weight by rating
-            else:
-                author_weights[author.id] = count
+        if author_ratings:
+            avg_rating = sum(author_ratings) / len(author_ratings)
+            author_weights[author.id] = count * (avg_rating / 5.0)  # Weight by rating
         else:
             author_weights[author.id] = count
     # Extract currently-reading genres/authors for recommendation boosting
@@ -299,25 +340,9 @@ def _build_anonymous_context(anon_session):
     currently_reading_authors = set()
     anon_dna = anon_session.dna_data or {}
     if anon_dna.get("currently_reading_books"):
-        for cr_book in anon_dna["currently_reading_books"]:
-            cr_author = cr_book.get("author", "")
-            cr_title = cr_book.get("title", "")
-            if cr_author:
-                normalized = Author._normalize(cr_author)
-                author = authors_dict.get(normalized)
-                if author:
-                    currently_reading_authors.add(author.id)
-            if cr_title and cr_author:
-                normalized_title = Book._normalize_title(cr_title)
-                normalized_author = Author._normalize(cr_author)
-                try:
-                    book_obj = Book.objects.get(
-                        normalized_title=normalized_title, author__normalized_name=normalized_author
-                    )
-                    for genre in book_obj.genres.all():
-                        currently_reading_genres.add(genre.name)
-                except Book.DoesNotExist:
-                    pass
+        currently_reading_genres, currently_reading_authors = _resolve_currently_reading(
+            anon_dna["currently_reading_books"], authors_by_name=authors_dict
+        )
 
     context = {
         "session": anon_session,
@@ -349,22 +374,22 @@ def _extract_series_info(books):
     return series_counter
 
 
+# Common series indicators ("... Book 2", "Vol 3", "#4", subtitles after ":" or " - ")
+_SERIES_INDICATOR_RE = re.compile(r" book | vol | volume |#|:| - ", re.IGNORECASE)
+
+
+@lru_cache(maxsize=8192)
 def _get_series_key(title):
     """
     Extract series identifier from book title.
     E.g., "Harry Potter and the..." -> "harry potter"
+    Memoized per title: the same popular books come up as candidates for many users.
     """
     if not title:
         return None
 
-    # Clean title
-    title_lower = title.lower()
-
-    # Remove common series indicators
-    for indicator in [" book ", " vol ", " volume ", "#", ":", " - "]:
-        if indicator in title_lower:
-            title_lower = title_lower.split(indicator)[0]
-            break
+    # Drop everything from the first series indicator onwards, then clean
+    title_lower = _SERIES_INDICATOR_RE.split(title, 1)[0].lower()
 
     # Get first 2-3 significant words
     words = [w for w in title_lower.split() if len(w) > 3]
@@ -376,6 +401,35 @@ def _get_series_key(title):
     return None
 
 
+def _meets_quality_threshold(prefix=""):
+    """
+    SQL form of the candidate quality floor: unrated books (NULL or 0) pass, rated books
+    need QUALITY_THRESHOLD. Applied where candidates are sourced so rejects never leave the DB.
+    """
+    return (
+        Q(**{f"{prefix}average_rating__isnull": True})
+        | Q(**{f"{prefix}average_rating": 0})
+        | Q(**{f"{prefix}average_rating__gte": QUALITY_THRESHOLD})
+    )
+
+
+def _get_genre_names_by_book(book_ids):
+    """
+    Map book_id -> genre names with a single query on the Book/Genre through table.
+    Lighter than prefetch_related("genres"): no Genre instances or related managers are built.
+    Names are sorted so explanations built from the first few stay the same across runs.
+    """
+    genres_by_book = defaultdict(list)
+    rows = (
+        Book.genres.through.objects.filter(book_id__in=list(book_ids))
+        .values_list("book_id", "genre__name")
+        .order_by("genre__name")
+    )
+    for book_id, genre_name in rows:
+        genres_by_book[book_id].append(genre_name)
+    return genres_by_book
+
+
 def _collect_candidates_from_similar_users(similar_users, read_book_ids, candidates):
     """
     Process similar users into recommendation candidates.
@@ -387,51 +441,53 @@ def _collect_candidates_from_similar_users(similar_users, read_book_ids, candida
     similar_user_ids = [su[0].id for su in similar_users]
     all_similar_user_books = (
         UserBook.objects.filter(Q(user_id__in=similar_user_ids) & (Q(is_top_book=True) | Q(user_rating__gte=4)))
+        .filter(_meets_quality_threshold("book__"))
+        .exclude(book_id__in=read_book_ids)
         .select_related("book", "book__author")
-        .prefetch_related("book__genres")
+        .only("id", "user_id", "user_rating", "is_top_book", *(f"book__{f}" for f in CANDIDATE_BOOK_FIELDS))
     )
 
     # Group by user_id for efficient lookup
-    books_by_user = {}
+    books_by_user = defaultdict(list)
     for ub in all_similar_user_books:
-        if ub.user_id not in books_by_user:
-            books_by_user[ub.user_id] = []
         books_by_user[ub.user_id].append(ub)
 
+    genres_by_book = _get_genre_names_by_book({ub.book_id for books in books_by_user.values() for ub in books})
+
     for similar_user, similarity_data in similar_users:
+        similarity_score = similarity_data["similarity_score"]
         for ub in books_by_user.get(similar_user.id, []):
             book_id = ub.book.id
-            if book_id in read_book_ids:
-                continue
-
-            if book_id not in candidates:
-                candidates[book_id] = {
+            entry = candidates.get(book_id)
+            if entry is None:
+                entry = candidates[book_id] = {
                     "book": ub.book,
+                    "genre_names": genres_by_book.get(book_id, []),
                     "sources": [],
+                    "best_source": None,
                     "max_similarity": 0,
                     "recommender_count": 0,
                     "total_weight": 0,
                 }
 
-            candidates[book_id]["sources"].append(
-                {
-                    "type": "similar_user",
-                    "username": similar_user.username,
-                    "user_id": similar_user.id,
-                    "similarity_score": similarity_data["similarity_score"],
-                    "is_top_book": ub.is_top_book,
-                    "user_rating": ub.user_rating,
-                    "match_quality": get_match_quality_label(similarity_data["similarity_score"]),
-                    "shared_books": similarity_data.get("shared_books_count", 0),
-                }
-            )
+            source = {
+                "type": "similar_user",
+                "username": similar_user.username,
+                "user_id": similar_user.id,
+                "similarity_score": similarity_score,
+                "is_top_book": ub.is_top_book,
+                "user_rating": ub.user_rating,
+                "match_quality": get_match_quality_label(similarity_score),
+                "shared_books": similarity_data.get("shared_books_count", 0),
+            }
+            entry["sources"].append(source)
 
-            candidates[book_id]["max_similarity"] = max(
-                candidates[book_id]["max_similarity"], similarity_data["similarity_score"]
-            )
-            candidates[book_id]["recommender_count"] += 1
-            weight = similarity_data["similarity_score"] * (1.5 if ub.is_top_book else 1.0)
-            candidates[book_id]["total_weight"] += weight
+            # Track the highest-similarity source as we go (first wins on ties, like max())
+            if entry["best_source"] is None or similarity_score > entry["max_similarity"]:
+                entry["best_source"] = source
+            entry["max_similarity"] = max(entry["max_similarity"], similarity_score)
+            entry["recommender_count"] += 1
+            entry["total_weight"] += similarity_score * (1.5 if ub.is_top_book else 1.0)
 
 
 def _collect_candidates_from_anonymized_profiles(matching_profiles, read_book_ids, candidates):
@@ -450,12 +506,14 @@ def _collect_candidates_from_anonymized_profiles(matching_profiles, read_book_id
 
     books_dict = {
         book.id: book
-        for book in Book.objects.filter(id__in=candidate_book_ids)
+        for book in Book.objects.filter(_meets_quality_threshold(), id__in=candidate_book_ids)
         .select_related("author")
-        .prefetch_related("genres")
+        .only(*CANDIDATE_BOOK_FIELDS)
     }
+    genres_by_book = _get_genre_names_by_book(books_dict.keys())
 
     for anon_profile, similarity_data in matching_profiles:
+        similarity_score = similarity_data["similarity_score"]
         for book_id in anon_profile.top_book_ids[:5]:
             if book_id in read_book_ids:
                 continue
@@ -463,55 +521,100 @@ def _collect_candidates_from_anonymized_profiles(matching_profiles, read_book_id
             if not book:
                 continue
 
-            if book_id not in candidates:
-                candidates[book_id] = {
+            entry = candidates.get(book_id)
+            if entry is None:
+                entry = candidates[book_id] = {
                     "book": book,
+                    "genre_names": genres_by_book.get(book_id, []),
                     "sources": [],
+                    "best_source": None,
                     "max_similarity": 0,
                     "recommender_count": 0,
                     "total_weight": 0,
                 }
 
-            candidates[book_id]["sources"].append(
-                {
-                    "type": "anonymized_profile",
-                    "similarity_score": similarity_data["similarity_score"],
-                }
-            )
-            candidates[book_id]["max_similarity"] = max(
-                candidates[book_id]["max_similarity"], similarity_data["similarity_score"]
-            )
-            candidates[book_id]["recommender_count"] += 1
-            candidates[book_id]["total_weight"] += (
-                similarity_data["similarity_score"] * RECOMMENDATION_WEIGHTS["ANON_PROFILE_SIMILARITY"]
-            )
-
-
-def _collect_candidates_for_user(user, user_context, limit=10):
-    """Collect candidate books from similar users, anonymized profiles, and fallbacks."""
-    candidates = {}
-    read_book_ids = user_context["read_book_ids"]
+            source = {
+                "type": "anonymized_profile",
+                "similarity_score": similarity_score,
+            }
+            entry["sources"].append(source)
+            if entry["best_source"] is None or similarity_score > entry["max_similarity"]:
+                entry["best_source"] = source
+            entry["max_similarity"] = max(entry["max_similarity"], similarity_score)
+            entry["recommender_count"] += 1
+            entry["total_weight"] += similarity_score * RECOMMENDATION_WEIGHTS["ANON_PROFILE_SIMILARITY"]
 
-    similar_users = find_similar_users(user, min_similarity=MIN_SIMILARITY)
-    _collect_candidates_from_similar_users(similar_users, read_book_ids, candidates)
 
+def _get_anonymized_profiles_sample():
+    """
+    Random sample of up to 100 anonymized profiles, shared by the user and anonymous paths.
+    Only the sampled ids are cached; rows are refetched with just the fields similarity reads.
+    """
     cache_key = "anon_profiles_sample"
-    anonymized_profiles = safe_cache_get(cache_key)
-    if anonymized_profiles is None:
+    sampled_ids = safe_cache_get(cache_key)
+    if sampled_ids is None:
         ids = list(AnonymizedReadingProfile.objects.values_list("id", flat=True))
-        sampled = random.sample(ids, min(len(ids), 100))
-        anonymized_profiles = list(AnonymizedReadingProfile.objects.filter(id__in=sampled))
-        safe_cache_set(cache_key, anonymized_profiles, 3600)
+        sampled_ids = random.sample(ids, min(len(ids), 100))
+        safe_cache_set(cache_key, sampled_ids, 3600)
+
+    return list(
+        AnonymizedReadingProfile.objects.filter(id__in=sampled_ids).only(
+            "id", "genre_distribution", "author_distribution", "top_book_ids"
+        )
+    )
+
+
+def _get_public_users_sample():
+    """
+    Up to 500 public, recommendation-visible users for the anonymous path.
+    Only ids are cached; users are refetched with the columns the similarity contexts need.
+    """
+    eligible = User.objects.filter(
+        userprofile__dna_data__isnull=False,
+        userprofile__is_public=True,
+        userprofile__visible_in_recommendations=True,
+    )
+
+    cache_key = "public_users_for_recs_sample"
+    user_ids = safe_cache_get(cache_key)
+    if user_ids is None:
+        user_ids = list(eligible.values_list("id", flat=True)[:500])
+        safe_cache_set(cache_key, user_ids, 1800)
+
+    return list(
+        eligible.filter(id__in=user_ids)
+        .select_related("userprofile")
+        .only(*SIMILARITY_CANDIDATE_FIELDS)
+    )
+
+
+def _collect_candidates_from_anonymized_sample(profile_data, read_book_ids, candidates, user_ctx=None):
+    """
+    Match profile_data (a User or AnonymousUserSession) against the sampled anonymized
+    profiles and merge the matches' top books into candidates. Shared by both flows.
+    """
+    anon_profiles = _get_anonymized_profiles_sample()
+    similarity_results = calculate_similarities_with_anonymized(profile_data, anon_profiles, user_ctx=user_ctx)
 
-    user_ctx = _build_user_context_for_similarity(user)
     matching_profiles = []
-    for anon_profile in anonymized_profiles:
-        similarity_data = calculate_similarity_with_anonymized(user, anon_profile, user_ctx=user_ctx)
+    for anon_profile, similarity_data in zip(anon_profiles, similarity_results):
         if similarity_data["similarity_score"] >= MIN_SIMILARITY:
             matching_profiles.append((anon_profile, similarity_data))
 
     _collect_candidates_from_anonymized_profiles(matching_profiles, read_book_ids, candidates)
 
+
+def _collect_candidates_for_user(user, user_context, limit=10):
+    """Collect candidate books from similar users, anonymized profiles, and fallbacks."""
+    candidates = {}
+    read_book_ids = user_context["read_book_ids"]
+
+    similar_users = find_similar_users(user, min_similarity=MIN_SIMILARITY)
+    _collect_candidates_from_similar_users(similar_users, read_book_ids, candidates)
+
+    user_ctx = _get_user_context_for_similarity(user)
+    _collect_candidates_from_anonymized_sample(user, read_book_ids, candidates, user_ctx=user_ctx)
+
     fallback_candidates = _get_fallback_candidates(user_context, limit=10)
     for book_id, candidate_data in fallback_candidates.items():
         if book_id not in candidates and book_id not in read_book_ids:
@@ -525,137 +628,177 @@ def _collect_candidates_for_anonymous(anon_session, anon_context):
     candidates = {}
     read_book_ids = anon_context["read_book_ids"]
 
-    cache_key = "public_users_for_recs_sample"
-    all_users = safe_cache_get(cache_key)
-    if all_users is None:
-        all_users = list(
-            User.objects.select_related("userprofile").filter(
-                userprofile__dna_data__isnull=False,
-                userprofile__is_public=True,
-                userprofile__visible_in_recommendations=True,
-            )[:500]
-        )
-        safe_cache_set(cache_key, all_users, 1800)
-
-    user_ids = [u.id for u in all_users]
+    all_users = _get_public_users_sample()
     user_lookup = {u.id: u for u in all_users}
-    all_user_contexts = _bulk_build_user_contexts(user_ids)
+    all_user_contexts = _get_cached_user_contexts(all_users)
+
+    scored_user_ids = [user_id for user_id, user_ctx in all_user_contexts.items() if user_ctx["book_ids"]]
+    similarity_results = calculate_anonymous_similarities_with_contexts(
+        anon_session, [all_user_contexts[user_id] for user_id in scored_user_ids]
+    )
 
     similarities = []
-    for user_id, user_ctx in all_user_contexts.items():
-        if not user_ctx["book_ids"]:
-            continue
-        similarity_data = calculate_anonymous_similarity_with_context(anon_session, user_ctx)
+    for user_id, similarity_data in zip(scored_user_ids, similarity_results):
         if similarity_data["similarity_score"] >= MIN_SIMILARITY:
             similarities.append((user_lookup[user_id], similarity_data))
 
-    similarities.sort(key=lambda x: x[1]["similarity_score"], reverse=True)
-    similar_users = similarities[:30]
+    # Partial sort: only the top 30 are kept, same ordering as sorted(..., reverse=True)[:30]
+    similar_users = heapq.nlargest(30, similarities, key=lambda x: x[1]["similarity_score"])
 
     _collect_candidates_from_similar_users(similar_users, read_book_ids, candidates)
 
-    cache_key = "anon_profiles_sample"
-    anonymized_profiles = safe_cache_get(cache_key)
-    if anonymized_profiles is None:
-        ids = list(AnonymizedReadingProfile.objects.values_list("id", flat=True))
-        sampled = random.sample(ids, min(len(ids), 100))
-        anonymized_profiles = list(AnonymizedReadingProfile.objects.filter(id__in=sampled))
-        safe_cache_set(cache_key, anonymized_profiles, 3600)
-    matching_profiles = []
-    for anon_profile in anonymized_profiles:
-        similarity_data = calculate_similarity_with_anonymized(anon_session, anon_profile)
-        if similarity_data["similarity_score"] >= MIN_SIMILARITY:
-            matching_profiles.append((anon_profile, similarity_data))
-
-    _collect_candidates_from_anonymized_profiles(matching_profiles, read_book_ids, candidates)
+    _collect_candidates_from_anonymized_sample(anon_session, read_book_ids, candidates)
 
     # Note: Fallback is handled in _get_recommendations_for_anonymous_uncached after candidate collection
     return candidates
 
 
-def _score_and_rank_candidates(candidates, context):
+def _score_and_rank_candidates(candidates, context, top_k=None):
     """
     Score candidates using improved algorithm with diminishing returns.
+    With top_k, only the top_k highest-scoring candidates are returned.
     """
-    scored_candidates = []
 
-    for book_id, candidate_data in candidates.items():
+    # Already read or disliked: one vectorized bitmap probe over all candidate ids
+    candidate_ids = np.fromiter(candidates.keys(), dtype=np.int64, count=len(candidates))
+    excluded_bitset = _build_book_id_bitset(context["read_book_ids"] | context["disliked_book_ids"])
+    is_excluded = _bitset_contains(excluded_bitset, candidate_ids)
+
+    # Genre names per surviving candidate; every candidate source attaches them when collecting
+    genre_names_by_book = {}
+    for (book_id, candidate_data), excluded in zip(candidates.items(), is_excluded.tolist()):
+        if excluded:
+            continue
+
         book = candidate_data["book"]
 
         # Skip if book fails quality checks
         if not _passes_quality_filters(book, context):
             continue
 
-        # Base score: Use square root to handle diminishing returns
-        # Instead of linear accumulation, use: sqrt(sum of squared similarities)
-        base_score = math.sqrt(candidate_data["total_weight"])
+        genre_names_by_book[book_id] = candidate_data["genre_names"]
+
+    # Genre alignment: How well does each book match user's preferences? (one batched pass)
+    genre_alignments = _calculate_genre_alignments(genre_names_by_book, context)
 
-        # Popularity factor: More recommenders = more confidence (but diminishing)
-        recommender_count = candidate_data["recommender_count"]
-        popularity_boost = math.log(recommender_count + 1) * RECOMMENDATION_WEIGHTS["POPULARITY"]
+    # Per-candidate inputs as parallel arrays in genre_names_by_book order; the score and
+    # confidence formulas then run as whole-array NumPy expressions
+    book_ids = list(genre_names_by_book)
+    current_year = timezone.now().year
+    total_weights = []
+    recommender_counts = []
+    max_similarities = []
+    ratings = []
+    recency_factors = []
+    currently_reading_boosts = []
+    for book_id, genre_names in genre_names_by_book.items():
+        candidate_data = candidates[book_id]
+        book = candidate_data["book"]
+        total_weights.append(candidate_data["total_weight"])
+        recommender_counts.append(candidate_data["recommender_count"])
+        max_similarities.append(candidate_data["max_similarity"])
+        ratings.append(book.average_rating or 0)
+        # Recency penalty: Slightly prefer newer books
+        recency_factors.append(_calculate_recency_factor(book, current_year))
+        # Currently-reading alignment boost
+        currently_reading_boosts.append(_calculate_currently_reading_boost(book, context, genre_names))
 
-        # Quality factor: Book's average rating
-        quality_score = 0
-        if book.average_rating and book.average_rating >= QUALITY_THRESHOLD:
-            quality_score = (book.average_rating - QUALITY_THRESHOLD) * RECOMMENDATION_WEIGHTS["QUALITY"]
+    alignments = np.fromiter(genre_alignments.values(), dtype=np.float64, count=len(book_ids))
+    ratings = np.array(ratings, dtype=np.float64)
 
-        # Genre alignment: How well does this book match user's preferences?
-        genre_alignment = _calculate_genre_alignment(book, context)
+    # Base score: Use square root to handle diminishing returns
+    # Instead of linear accumulation, use: sqrt(sum of squared similarities)
+    base_scores = np.sqrt(np.array(total_weights, dtype=np.float64))
 
-        # Recency penalty: Slightly prefer newer books
-        recency_factor = _calculate_recency_factor(book)
+    # Popularity factor: More recommenders = more confidence (but diminishing)
+    log_recommenders = np.log(np.array(recommender_counts, dtype=np.float64) + 1)
+    popularity_boosts = log_recommenders * RECOMMENDATION_WEIGHTS["POPULARITY"]
 
-        # Currently-reading alignment boost
-        currently_reading_boost = _calculate_currently_reading_boost(book, context)
-
-        # Final score calculation
-        final_score = (
-            base_score * 1.0
-            + popularity_boost
-            + quality_score
-            + genre_alignment * RECOMMENDATION_WEIGHTS["GENRE_ALIGNMENT"]
-            + recency_factor * RECOMMENDATION_WEIGHTS["RECENCY"]
-            + currently_reading_boost * RECOMMENDATION_WEIGHTS["CURRENTLY_READING"]
-        )
+    # Quality factor: Book's average rating above the threshold
+    quality_scores = np.where(
+        ratings >= QUALITY_THRESHOLD, (ratings - QUALITY_THRESHOLD) * RECOMMENDATION_WEIGHTS["QUALITY"], 0.0
+    )
 
-        base_confidence = candidate_data["max_similarity"]
+    # Final score calculation
+    scores = (
+        base_scores
+        + popularity_boosts
+        + quality_scores
+        + alignments * RECOMMENDATION_WEIGHTS["GENRE_ALIGNMENT"]
+        + np.array(recency_factors, dtype=np.float64) * RECOMMENDATION_WEIGHTS["RECENCY"]
+        + np.array(currently_reading_boosts, dtype=np.float64) * RECOMMENDATION_WEIGHTS["CURRENTLY_READING"]
+    )
 
-        # Diminishing boost per additional recommender
-        recommender_boost = (
-            math.log(candidate_data["recommender_count"] + 1) * RECOMMENDATION_WEIGHTS["RECOMMENDER_CONFIDENCE"]
-        )
+    # Confidence: best similarity plus a diminishing boost per additional recommender, capped at 100%
+    recommender_boosts = log_recommenders * RECOMMENDATION_WEIGHTS["RECOMMENDER_CONFIDENCE"]
+    confidences = np.minimum(np.array(max_similarities, dtype=np.float64) + recommender_boosts, 1.0)
 
-        # Combine and cap at 100%
-        confidence = min(base_confidence + recommender_boost, 1.0)
+    order = _top_k_order(scores, top_k)
 
+    scores = scores.tolist()
+    confidences = confidences.tolist()
+    alignments = alignments.tolist()
+    scored_candidates = []
+    for i in order.tolist():
+        book_id = book_ids[i]
+        candidate_data = candidates[book_id]
         scored_candidates.append(
             {
-                "book": book,
-                "score": final_score,
-                "confidence": confidence,
+                "book": candidate_data["book"],
+                "score": scores[i],
+                "confidence": confidences[i],
                 "max_similarity": candidate_data["max_similarity"],
-                "recommender_count": recommender_count,
+                "recommender_count": candidate_data["recommender_count"],
                 "sources": candidate_data["sources"],
-                "genre_alignment": genre_alignment,
+                "best_source": candidate_data["best_source"],
+                "genre_alignment": alignments[i],
+                "genre_names": genre_names_by_book[book_id],
             }
         )
 
-    # Sort by score descending
-    scored_candidates.sort(key=lambda x: x["score"], reverse=True)
-
     return scored_candidates
 
 
-def _passes_quality_filters(book, context):
-    """Check if book passes various quality filters"""
+def _top_k_order(scores, top_k=None):
+    """
+    Indices of scores, highest first, ties kept in their original order (a stable sort).
+    With top_k, only the k best are selected (np.partition) and sorted, so ranking a large
+    candidate pool costs O(n + k log k) instead of a full O(n log n) sort.
+    """
+    if top_k is None or top_k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
 
-    # Already read
-    if book.id in context["read_book_ids"]:
-        return False
+    # Everything scoring at least the k-th largest value; ties at the cutoff stay in index order
+    kth_largest = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+    shortlist = np.flatnonzero(scores >= kth_largest)
+    return shortlist[np.argsort(-scores[shortlist], kind="stable")][:top_k]
 
-    # User disliked similar books
-    if book.id in context["disliked_book_ids"]:
-        return False
+
+def _build_book_id_bitset(book_ids):
+    """Pack book ids into a uint8 bitmap: bit (id & 7) of byte (id >> 3) is set for every id."""
+    ids = np.fromiter(book_ids, dtype=np.int64, count=len(book_ids))
+    bitset = np.zeros((int(ids.max()) >> 3) + 1 if ids.size else 0, dtype=np.uint8)
+    np.bitwise_or.at(bitset, ids >> 3, np.left_shift(1, ids & 7).astype(np.uint8))
+    return bitset
+
+
+def _bitset_contains(bitset, ids):
+    """Vectorized membership test of an int64 id array against a _build_book_id_bitset bitmap."""
+    byte_idx = ids >> 3
+    in_range = byte_idx < bitset.size
+    contains = np.zeros(ids.shape, dtype=bool)
+    contains[in_range] = ((bitset[byte_idx[in_range]] >> (ids[in_range] & 7)) & 1).astype(bool)
+    return contains
+
+
+def _passes_quality_filters(book, context):
+    """
+    Check if book passes the saturation filters.
+    Read/disliked exclusion happens up front in _score_and_rank_candidates, and every
+    candidate source applies the rating floor in SQL (_meets_quality_threshold).
+    """
 
     # Series saturation check
     series_key = _get_series_key(book.title)
@@ -663,64 +806,72 @@ def _passes_quality_filters(book, context):
         return False
 
     # Author saturation check (read 3+ books from this author)
-    if book.author.id in context["author_saturation"]:
-        if context["author_saturation"][book.author.id] >= 4:
-            # Only recommend if it's really highly rated
-            if not book.average_rating or book.average_rating < 4.3:
-                return False
-
-    # Quality threshold
-    if book.average_rating and book.average_rating < QUALITY_THRESHOLD:
-        return False
+    if context["author_saturation"].get(book.author_id, 0) >= 4:
+        # Only recommend if it's really highly rated
+        rating = book.average_rating
+        if not rating or rating < 4.3:
+            return False
 
     return True
 
 
-def _calculate_genre_alignment(book, context):
+def _calculate_genre_alignments(genre_names_by_book, context):
     """
-    Calculate how well book's genres align with user preferences.
-    Returns score 0-1.
+    Calculate how well each book's genres align with user preferences.
+    Equivalent to multiplying a (books x genres) indicator matrix by the preference
+    vector: every (book, genre) pair is flattened once and summed per book with
+    np.bincount instead of per-book dict walks.
+    Returns {book_id: score 0-1}.
     """
-    if not context["genre_preferences"]:
-        return 0.5  # Neutral if no preferences known
+    book_ids = list(genre_names_by_book)
+    genre_preferences = context["genre_preferences"]
+    if not genre_preferences:
+        return dict.fromkeys(book_ids, 0.5)  # Neutral if no preferences known
+
+    # Only genres the user has a preference for contribute weight, so intersect with the
+    # preference keys first; books with no overlap never enter the flattened pairs
+    preference_genres = genre_preferences.keys()
+    has_genres = np.zeros(len(book_ids), dtype=bool)
+    rows = []
+    weights = []
+    for row, book_id in enumerate(book_ids):
+        book_genres = genre_names_by_book[book_id]
+        if not book_genres:
+            continue
+        has_genres[row] = True
+        for genre in preference_genres & book_genres:
+            rows.append(row)
+            weights.append(genre_preferences[genre])
 
-    # Use prefetched genres - this should not trigger a query if prefetch_related was used
-    book_genres = set(genre.name for genre in book.genres.all())
+    # Calculate weighted overlap
+    alignment = np.bincount(np.array(rows, dtype=np.intp), weights=weights, minlength=len(book_ids))
 
-    if not book_genres:
-        return 0.3  # Slight penalty for books without genre data
+    # Normalize (cap at 1.0); slight penalty for books without genre data
+    scores = np.where(has_genres, np.minimum(alignment * 2, 1.0), 0.3)
+    return dict(zip(book_ids, scores.tolist()))
 
-    # Calculate weighted overlap
-    alignment = sum(context["genre_preferences"].get(genre, 0) for genre in book_genres)
 
-    # Normalize
-    return min(alignment * 2, 1.0)  # Cap at 1.0
+# Recency boost by book age: <=3 years (or future) 0.15, <=10 0.1, <=20 0.05, older 0
+_RECENCY_AGE_LIMITS = (3, 10, 20)
+_RECENCY_BOOSTS = (0.15, 0.1, 0.05, 0)
 
 
-def _calculate_recency_factor(book):
+def _calculate_recency_factor(book, current_year=None):
     """
     Slight boost for newer books to promote discovery.
-    Returns score 0-0.2
+    Returns score 0-0.2. Pass current_year when scoring a batch to skip the clock lookup.
     """
     if not book.publish_year:
         return 0
 
-    current_year = timezone.now().year
+    if current_year is None:
+        current_year = timezone.now().year
     years_old = current_year - book.publish_year
 
-    if years_old < 0:  # Future publication
-        return 0.15
-    elif years_old <= 3:
-        return 0.15
-    elif years_old <= 10:
-        return 0.1
-    elif years_old <= 20:
-        return 0.05
-    else:
-        return 0
+    return _RECENCY_BOOSTS[bisect_left(_RECENCY_AGE_LIMITS, years_old)]
 
 
-def _calculate_currently_reading_boost(book, context):
+def _calculate_currently_reading_boost(book, context, genre_names=None):
     """Give a small boost to books matching genres/authors of currently-reading books. Returns 0-0.15."""
     boost = 0.0
     cr_genres = context.get("currently_reading_genres", set())
@@ -729,7 +880,10 @@ def _calculate_currently_reading_boost(book, context):
     if book.author.id in cr_authors:
         boost += 0.10
 
-    book_genres = {genre.name for genre in book.genres.all()}
+    if genre_names is not None:
+        book_genres = set(genre_names)
+    else:
+        book_genres = {genre.name for genre in book.genres.all()}
     matching_genres = book_genres & cr_genres
     if matching_genres:
         boost += min(len(matching_genres) * 0.05, 0.10)
@@ -742,30 +896,37 @@ def _apply_diversity_filter(ranked_candidates, context, limit):
     Apply diversity filtering to avoid recommending too many books from same genre/author.
     """
     final_recommendations = []
-    genre_counts = Counter()
-    author_counts = Counter()
+    genre_counts = {}
+    author_counts = {}
+    # Loop invariants: diversity only kicks in after the first half, and only
+    # candidates within 80% of the top score may bypass it
+    half_limit = limit * 0.5
+    top_score_threshold = ranked_candidates[0]["score"] * 0.8 if ranked_candidates else 0
 
     for candidate in ranked_candidates:
         if len(final_recommendations) >= limit:
             break
 
         book = candidate["book"]
-        # Use prefetched genres - should not trigger query if prefetch_related was used
-        book_genres = set(genre.name for genre in book.genres.all())
+        book_genres = set(candidate["genre_names"])
 
         # Check diversity constraints
         # Don't recommend more than 3 books from same primary genre
-        primary_genre_violation = any(genre_counts[genre] >= 3 for genre in book_genres)
+        primary_genre_violation = False
+        for genre in book_genres:
+            if genre_counts.get(genre, 0) >= 3:
+                primary_genre_violation = True
+                break
 
         # Don't recommend more than 2 books from same author
-        author_violation = author_counts[book.author.id] >= 2
+        author_violation = author_counts.get(book.author.id, 0) >= 2
 
         # Apply diversity factor: skip if violates constraints
         # BUT allow if it's a very high score (top candidates bypass diversity)
-        if len(final_recommendations) >= limit * 0.5:  # After first half
+        if len(final_recommendations) >= half_limit:  # After first half
             if primary_genre_violation or author_violation:
                 # Skip unless score is exceptional
-                if candidate["score"] < ranked_candidates[0]["score"] * 0.8:
+                if candidate["score"] < top_score_threshold:
                     continue
 
         # Add to recommendations
@@ -773,8 +934,8 @@ def _apply_diversity_filter(ranked_candidates, context, limit):
 
         # Update counters
         for genre in book_genres:
-            genre_counts[genre] += 1
-        author_counts[book.author.id] += 1
+            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+        author_counts[book.author.id] = author_counts.get(book.author.id, 0) + 1
 
     return final_recommendations
 
@@ -794,9 +955,10 @@ def _add_explanations(recommendations, context):
         # Use a dictionary to hold the separate parts of the explanation
         rec["explanation_components"] = {}
         sources = rec["sources"]
+        rating = rec["book"].average_rating
 
-        # Find the best source to attribute the recommendation to
-        best_source = max(sources, key=lambda s: s.get("similarity_score", 0))
+        # The source to attribute the recommendation to, tracked while candidates were collected
+        best_source = rec["best_source"]
 
         # --- Component 1: Shared Books ---
         if best_source["type"] == "similar_user":
@@ -813,8 +975,7 @@ def _add_explanations(recommendations, context):
 
         # --- Component 2: Genre Match ---
         if rec.get("genre_alignment", 0) > 0.6:
-            # Use prefetched genres - should not trigger query
-            book_genres = [genre.name for genre in rec["book"].genres.all()[:2]]
+            book_genres = rec["genre_names"][:2]
             if book_genres:
                 genre_str = ", ".join(book_genres)
                 rec["explanation_components"]["genre"] = f"matches your interest in {genre_str}"
@@ -831,22 +992,40 @@ def _add_explanations(recommendations, context):
             ] = f"loved by {rec['recommender_count']} other similar readers"
 
         # --- Component 4: Quality indicator ---
-        if rec["book"].average_rating and rec["book"].average_rating >= 4.2:
-            rec["explanation_components"]["rating"] = f"highly rated ({rec['book'].average_rating:.1f}★)"
+        if rating and rating >= 4.2:
+            rec["explanation_components"]["rating"] = f"highly rated ({rating:.1f}★)"
 
         # --- Component 5: Global popularity fallback ---
         if any(s.get("type") == "global_popularity" for s in sources):
             rec["explanation_components"]["discovery"] = "popular across the Bibliotype community"
 
         if not rec["explanation_components"]:
-            if rec["book"].average_rating:
-                rec["explanation_components"]["rating"] = f"highly rated ({rec['book'].average_rating:.1f}★)"
+            if rating:
+                rec["explanation_components"]["rating"] = f"highly rated ({rating:.1f}★)"
             else:
                 rec["explanation_components"]["discovery"] = "popular across the Bibliotype community"
 
     return recommendations
 
 
+def _genres_prefetch():
+    """Genres as a plain list on book.prefetched_genres, fetching only the name column."""
+    return Prefetch("genres", queryset=Genre.objects.only("id", "name"), to_attr="prefetched_genres")
+
+
+def _already_read(context):
+    """
+    Filter matching books the reader already has, for .exclude() on Book querysets.
+    Registered users get a correlated EXISTS on their UserBook rows (every read or disliked
+    book is one), so their library never travels as an IN list; anonymous sessions only
+    have the ids stored on the session.
+    """
+    user = context.get("user")
+    if user is not None:
+        return Exists(UserBook.objects.filter(user_id=user.id, book_id=OuterRef("pk")))
+    return Q(id__in=context["read_book_ids"])
+
+
 def _get_fallback_candidates(context, limit=20):
     """
     Get fallback candidates when not enough recommendations from similar users.
@@ -862,21 +1041,39 @@ def _get_fallback_candidates(context, limit=20):
             if context.get("author_saturation", {}).get(author_id, 0) < 3
         ]
 
-        for author_id in top_authors[:5]:
-            books = (
-                Book.objects.filter(author_id=author_id, average_rating__gte=QUALITY_THRESHOLD)
-                .exclude(id__in=context["read_book_ids"])
-                .select_related("author")
-                .prefetch_related("genres")[:3]
+        top_authors = top_authors[:5]
+
+        # Each author's 3 best-rated unread books in one query (row_number per author)
+        books_by_author = defaultdict(list)
+        author_books = (
+            Book.objects.filter(author_id__in=top_authors, average_rating__gte=QUALITY_THRESHOLD)
+            .exclude(_already_read(context))
+            .annotate(
+                author_rank=Window(
+                    RowNumber(),
+                    partition_by=F("author_id"),
+                    order_by=[F("average_rating").desc(), F("id").asc()],
+                )
             )
+            .filter(author_rank__lte=3)
+            .select_related("author")
+            .only(*CANDIDATE_BOOK_FIELDS)
+            .prefetch_related(_genres_prefetch())
+        )
+        for book in author_books:
+            books_by_author[book.author_id].append(book)
 
-            for book in books:
+        for author_id in top_authors:
+            for book in books_by_author.get(author_id, []):
                 if len(candidates) >= limit:
                     break
 
+                source = {"type": "fallback_author", "reason": f"From favorite author {book.author.name}"}
                 candidates[book.id] = {
                     "book": book,
-                    "sources": [{"type": "fallback_author", "reason": f"From favorite author {book.author.name}"}],
+                    "genre_names": [genre.name for genre in book.prefetched_genres],
+                    "sources": [source],
+                    "best_source": source,
                     "max_similarity": 0.4,  # Lower base similarity
                     "recommender_count": 1,
                     "total_weight": 0.4,
@@ -884,43 +1081,54 @@ def _get_fallback_candidates(context, limit=20):
 
     # Strategy 2: Highly-rated books in favorite genres
     if len(candidates) < limit and context.get("genre_preferences"):
-        top_genres = sorted(context["genre_preferences"].items(), key=lambda x: x[1], reverse=True)[:3]
-
-        for genre_name, weight in top_genres:
-            try:
-                genre = Genre.objects.get(name=genre_name)
-                books = (
-                    Book.objects.filter(genres=genre, average_rating__gte=4.0)
-                    .exclude(id__in=context["read_book_ids"])
-                    .order_by("-average_rating")
-                    .select_related("author")
-                    .prefetch_related("genres")[:5]
-                )
+        top_genres = heapq.nlargest(3, context["genre_preferences"].items(), key=lambda x: x[1])
+        top_genre_names = [genre_name for genre_name, _ in top_genres]
+
+        # Top 5 books per genre in one query; a book in several top genres comes back once per genre
+        books_by_genre = defaultdict(list)
+        genre_books = (
+            Book.objects.filter(genres__name__in=top_genre_names, average_rating__gte=4.0)
+            .exclude(_already_read(context))
+            .annotate(
+                matched_genre=F("genres__name"),
+                genre_rank=Window(RowNumber(), partition_by=F("genres__name"), order_by=F("average_rating").desc()),
+            )
+            .filter(genre_rank__lte=5)
+            .order_by("-average_rating")
+            .select_related("author")
+            .only(*CANDIDATE_BOOK_FIELDS)
+            .prefetch_related(_genres_prefetch())
+        )
+        for book in genre_books:
+            books_by_genre[book.matched_genre].append(book)
 
-                for book in books:
-                    if len(candidates) >= limit:
-                        break
-
-                    if book.id not in candidates:
-                        candidates[book.id] = {
-                            "book": book,
-                            "sources": [{"type": "fallback_genre", "reason": f"Popular {genre_name} book"}],
-                            "max_similarity": 0.3,
-                            "recommender_count": 1,
-                            "total_weight": 0.3,
-                        }
-            except Genre.DoesNotExist:
-                continue
+        for genre_name in top_genre_names:
+            for book in books_by_genre.get(genre_name, []):
+                if len(candidates) >= limit:
+                    break
+
+                if book.id not in candidates:
+                    source = {"type": "fallback_genre", "reason": f"Popular {genre_name} book"}
+                    candidates[book.id] = {
+                        "book": book,
+                        "genre_names": [genre.name for genre in book.prefetched_genres],
+                        "sources": [source],
+                        "best_source": source,
+                        "max_similarity": 0.3,
+                        "recommender_count": 1,
+                        "total_weight": 0.3,
+                    }
 
     # Strategy 3: Globally popular books (last resort)
     if len(candidates) < limit:
         remaining = limit - len(candidates)
         popular_books = (
             Book.objects.filter(average_rating__gte=4.0)
-            .exclude(id__in=context["read_book_ids"])
+            .exclude(_already_read(context))
             .exclude(id__in=candidates.keys())
             .select_related("author")
-            .prefetch_related("genres")
+            .only(*CANDIDATE_BOOK_FIELDS)
+            .prefetch_related(_genres_prefetch())
             .order_by("-google_books_ratings_count", "-average_rating")[: remaining * 3]
         )
 
@@ -932,9 +1140,12 @@ def _get_fallback_candidates(context, limit=20):
                 continue
             seen_authors.add(book.author_id)
 
+            source = {"type": "global_popularity", "similarity_score": 0.2}
             candidates[book.id] = {
                 "book": book,
-                "sources": [{"type": "global_popularity", "similarity_score": 0.2}],
+                "genre_names": [genre.name for genre in book.prefetched_genres],
+                "sources": [source],
+                "best_source": source,
                 "max_similarity": 0.2,
                 "recommender_count": 1,
                 "total_weight": 0.2,
@@ -1,64 +1,100 @@
+from functools import lru_cache
+
+import numpy as np
+from django.db import transaction
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
 from ..models import UserBook
 
 # Reviews shorter than this carry too little signal for sentiment scoring
 MIN_REVIEW_LENGTH_FOR_SENTIMENT = 15
 
+# Top-book score weights, shared by compute_book_score and _score_user_books.
+# Rating weight indexed by star rating (0 = unrated): heavy, with 4 and 5 stars well clear of the rest
+RATING_SCORES = (0, 15, 30, 45, 80, 100)
+_RATING_SCORES_ARRAY = np.array(RATING_SCORES, dtype=np.float64)
+# Multiplies the review's VADER compound score (-1..1)
+SENTIMENT_WEIGHT = 30
+# Small boost for books with neither a rating nor a usable review, to include them if nothing else
+UNSCORED_BOOK_BONUS = 10
+
+# Loading the VADER lexicon is the expensive part, so do it once per process
+_ANALYZER = SentimentIntensityAnalyzer()
+
+
+@lru_cache(maxsize=4096)
+def review_sentiment(review):
+    """VADER compound score for a review.
+
+    Memoized on the text: one upload scores the same reviews for the DNA summary, the
+    anonymous top books and calculate_and_store_top_books, and recomputes rescore them.
+    """
+    return _ANALYZER.polarity_scores(review)["compound"]
+
 
 def compute_book_score(rating, sentiment):
-    """Canonical top-book score, shared by the authenticated and anonymous paths.
+    """Top-book score for a single book; the anonymous path scores its CSV rows with this.
 
+    Same rules (and constants) as _score_user_books, which scores a stored library in one pass.
     rating: int 1-5 (or None/0 when unrated)
     sentiment: VADER compound score for the review, or None when there is no usable review
     """
-    score = 0
-
-    # Rating weight (heavily weighted if present)
-    if rating:
-        if rating == 5:
-            score += 100
-        elif rating == 4:
-            score += 80
-        else:
-            score += rating * 15
-
-    # Review sentiment weight
-    if sentiment is not None:
-        score += sentiment * 30
+    score = RATING_SCORES[min(max(rating or 0, 0), 5)]
 
-    # Small boost for books without ratings or reviews (to include them if nothing else)
-    if not rating and sentiment is None:
-        score += 10
+    if sentiment is not None:
+        score += sentiment * SENTIMENT_WEIGHT
+    elif not rating:
+        score += UNSCORED_BOOK_BONUS
 
     return score
 
 
-def calculate_and_store_top_books(user, limit=5):
-    """Calculate and store user's top books based on rating and review sentiment"""
+def _score_user_books(user_books):
+    """compute_book_score for every UserBook at once, as a float64 array in the same order.
 
-    user_books = UserBook.objects.filter(user=user).select_related("book", "book__author")
+    Ratings are scored with a table lookup; VADER only runs on the rows that have a usable review.
+    """
+    ratings = np.fromiter((ub.user_rating or 0 for ub in user_books), dtype=np.int64, count=len(user_books))
+    scores = _RATING_SCORES_ARRAY[np.clip(ratings, 0, 5)]
 
-    book_scores = []
-    analyzer = SentimentIntensityAnalyzer()
+    # One sentiment pass over the distinct usable reviews, scattered back onto their rows
+    reviewed_rows = [
+        i
+        for i, user_book in enumerate(user_books)
+        if user_book.user_review and len(user_book.user_review) > MIN_REVIEW_LENGTH_FOR_SENTIMENT
+    ]
+    reviews = [user_books[i].user_review for i in reviewed_rows]
+    sentiment_by_review = {review: review_sentiment(review) for review in dict.fromkeys(reviews)}
 
-    for user_book in user_books:
-        sentiment = None
-        if user_book.user_review and len(user_book.user_review) > MIN_REVIEW_LENGTH_FOR_SENTIMENT:
-            sentiment = analyzer.polarity_scores(user_book.user_review)["compound"]
+    has_sentiment = np.zeros(len(user_books), dtype=bool)
+    if reviewed_rows:
+        scores[reviewed_rows] += np.array([sentiment_by_review[review] for review in reviews]) * SENTIMENT_WEIGHT
+        has_sentiment[reviewed_rows] = True
 
-        book_scores.append((user_book, compute_book_score(user_book.user_rating, sentiment)))
+    # Small boost for books without ratings or reviews
+    scores[(ratings == 0) & ~has_sentiment] += UNSCORED_BOOK_BONUS
+    return scores
 
-    # Sort by score
-    book_scores.sort(key=lambda x: x[1], reverse=True)
-    top_book_objects = [ub for ub, score in book_scores[:limit]]
 
-    # Reset all flags
-    UserBook.objects.filter(user=user).update(is_top_book=False, top_book_position=None)
+def calculate_and_store_top_books(user, limit=5):
+    """Calculate and store user's top books based on rating and review sentiment"""
+
+    # Scoring reads only the rating and review, and the flags are written back by pk, so the
+    # rest of each row (and its Book/Author) is never loaded
+    user_books = list(UserBook.objects.filter(user=user).only("id", "user_rating", "user_review"))
+    scores = _score_user_books(user_books)
 
-    # Mark top books
+    # Highest score first; the stable sort keeps library order among ties, like list.sort did
+    top_indices = np.argsort(-scores, kind="stable")[:limit]
+    top_book_objects = [user_books[i] for i in top_indices]
+
+    # Mark top books in memory, then reset all flags and write the new ones in one UPDATE
     for position, user_book in enumerate(top_book_objects, 1):
         user_book.is_top_book = True
         user_book.top_book_position = position
-        user_book.save()
+
+    with transaction.atomic():
+        UserBook.objects.filter(user=user).update(is_top_book=False, top_book_position=None)
+        UserBook.objects.bulk_update(top_book_objects, ["is_top_book", "top_book_position"], batch_size=100)
 
     return top_book_objects
@@ -1,11 +1,40 @@
+import heapq
+import math
 import numpy as np
 from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
 from ..dna_constants import CANONICAL_GENRE_MAP
 from ..models import UserBook, User, Book, Author, AnonymousUserSession, AnonymizedReadingProfile
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Columns the similarity contexts actually read, fetched as plain tuples (no model instances)
+_SIMILARITY_USERBOOK_FIELDS = (
+    "user_id",
+    "book_id",
+    "user_rating",
+    "is_top_book",
+    "book__publish_year",
+    "book__author__normalized_name",
+)
+
+# Per-user similarity contexts only change when the user's library does: entries are
+# validated against userprofile.last_updated and dropped by invalidate_user_caches.
+SIMILARITY_CONTEXT_CACHE_TTL = 86400
+# Bump whenever the context dict built by _bulk_build_user_contexts changes shape
+SIMILARITY_CONTEXT_VERSION = 6
+# Candidate users only need their id, username (for result display) and the profile
+# timestamp that keys their cached context; dna_data is never read when scoring
+SIMILARITY_CANDIDATE_FIELDS = ("id", "username", "userprofile__id", "userprofile__last_updated")
+
+# similar_users_ entries are validated against the ubook_ver_ tokens of the user and every
+# listed neighbour on each read. A reader who newly out-ranks the cached neighbours is the one
+# change the tokens can't see, so the TTL bounds how long that takes to surface.
+SIMILAR_USERS_CACHE_TTL = 21600
+
 
 def _canonicalize_genre_counter(counts):
     """Fold a {genre_name: weight} mapping onto canonical genre names.
@@ -20,183 +49,252 @@ def _canonicalize_genre_counter(counts):
     return canonical
 
 
-def _calculate_cosine_similarity(counter1, counter2):
-    """Calculate cosine similarity between two Counter objects"""
-    all_keys = set(counter1.keys()) | set(counter2.keys())
-    if not all_keys:
-        return 0
-
-    vec1 = np.array([counter1.get(k, 0) for k in all_keys])
-    vec2 = np.array([counter2.get(k, 0) for k in all_keys])
+def _counter_norm(counter):
+    """L2 norm of a Counter's values (plain math: NumPy call overhead dominates for small Counters)."""
+    return math.sqrt(sum(value * value for value in counter.values()))
 
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
 
+def _calculate_cosine_similarity(counter1, counter2, norm1=None, norm2=None):
+    """
+    Calculate cosine similarity between two Counter objects.
+    Only keys present in both contribute to the dot product, so it walks the smaller
+    Counter's keys instead of building dense vectors over the union. Norms precomputed
+    with _counter_norm (e.g. a context's genre_norm) may be passed in.
+    """
+    if norm1 is None:
+        norm1 = _counter_norm(counter1)
+    if norm2 is None:
+        norm2 = _counter_norm(counter2)
     if norm1 == 0 or norm2 == 0:
         return 0
 
+    if len(counter1) > len(counter2):
+        counter1, counter2 = counter2, counter1
+    dot_product = sum(value * counter2[key] for key, value in counter1.items() if key in counter2)
+
     return float(dot_product / (norm1 * norm2))
 
 
-def _build_user_context_for_similarity(user):
+def _batch_cosine_similarities(target, counters, norms=None):
     """
-    Pre-build all user data needed for similarity calculations.
-    This should be called ONCE per user and reused for all comparisons.
-    Returns a dict with all pre-computed data structures.
+    Cosine similarity of one Counter against many, as a float array in counters order.
+    Only keys present in target contribute to a dot product, so every counter is projected
+    onto target's keys (a counters x target-keys matrix) and scored with one matrix-vector
+    product. Norms still cover each counter's full vocabulary, so the result matches
+    _calculate_cosine_similarity pair by pair. Pass norms (one per counter) when they are
+    already cached on the contexts.
+    The projection is float32: weights are integer counts, which float32 holds exactly, and
+    the matrix is the only allocation here that grows with the candidate pool.
     """
-    # Single query with all needed relations
-    user_books_qs = (
-        UserBook.objects.filter(user=user).select_related("book", "book__author").prefetch_related("book__genres")
-    )
+    similarities = np.zeros(len(counters))
+    target_norm = _counter_norm(target)
+    if target_norm == 0 or not counters:
+        return similarities
+
+    column_by_key = {key: column for column, key in enumerate(target)}
+    target_vec = np.fromiter(target.values(), dtype=np.float32, count=len(column_by_key))
+
+    # Probe from whichever side is smaller (a prolific reader's author Counter can dwarf the
+    # target's), collecting coordinates so the matrix is filled in one scatter
+    rows, columns, values = [], [], []
+    for row, counter in enumerate(counters):
+        if len(counter) < len(column_by_key):
+            for key, value in counter.items():
+                column = column_by_key.get(key)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(value)
+        else:
+            for key, column in column_by_key.items():
+                value = counter.get(key)
+                if value is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(value)
 
-    # Convert to list ONCE to avoid multiple evaluations
-    user_books_list = list(user_books_qs)
+    projected = np.zeros((len(counters), len(column_by_key)), dtype=np.float32)
+    projected[rows, columns] = values
 
-    # Pre-compute all data in a single pass
-    book_ids = set()
-    top_book_ids = set()
-    book_ratings = {}  # book_id -> rating
-    genre_weights = Counter()
-    author_weights = Counter()
-    ratings_list = []
-    years_weighted = []
+    if norms is None:
+        norms = [_counter_norm(counter) for counter in counters]
+    norms = np.array(norms, dtype=np.float64)
 
-    for ub in user_books_list:
-        book_id = ub.book_id
-        book_ids.add(book_id)
+    # GEMV over the whole matrix: zero-norm rows are all zeros, and masking the matrix first
+    # would copy it just to skip them
+    dots = projected @ target_vec
+    has_norm = norms > 0
+    similarities[has_norm] = dots[has_norm] / (norms[has_norm] * target_norm)
+    return similarities
 
-        if ub.is_top_book:
-            top_book_ids.add(book_id)
 
-        rating = ub.user_rating
-        if rating:
-            book_ratings[book_id] = rating
-            ratings_list.append(rating)
+def _build_user_context_for_similarity(user):
+    """
+    Pre-build all user data needed for similarity calculations.
+    This should be called ONCE per user and reused for all comparisons.
+    Returns a dict with all pre-computed data structures (see _bulk_build_user_contexts).
+    """
+    return _bulk_build_user_contexts([user.id])[user.id]
 
-        weight = rating if rating else 3
 
-        # Genres (prefetched, no query) — canonicalized so old genre rows compare
-        for genre in ub.book.genres.all():
-            genre_weights[CANONICAL_GENRE_MAP.get(genre.name, genre.name)] += weight
+def _rating_profile(rating_dist):
+    """
+    Fixed-layout rating features for one user: the share of ratings at each of 1-5 stars as a
+    length-5 array, and the mean rating. Counter({5: 2, 3: 2}) -> ([0, 0, .5, 0, .5], 4.0).
+    Returns (None, None) for users with no ratings.
+    """
+    total = sum(rating_dist.values())
+    if not total:
+        return None, None
+    shares = np.fromiter((rating_dist.get(r, 0) for r in range(1, 6)), dtype=np.float64, count=5) / total
+    mean = sum(r * count for r, count in rating_dist.items()) / total
+    return shares, mean
 
-        # Authors (select_related, no query)
-        author_weights[ub.book.author.normalized_name] += weight
 
-        # Publication years
-        if ub.book.publish_year:
-            years_weighted.extend([ub.book.publish_year] * int(weight))
+def _calculate_rating_pattern_similarity_from_context(ctx1, ctx2):
+    """Compare rating distribution patterns using pre-built contexts"""
+    if ctx1["rating_mean"] is None or ctx2["rating_mean"] is None:
+        return 0.5  # Neutral similarity
 
-    # Rating distribution
-    rating_dist = Counter(ratings_list)
+    # Compare proportions at each rating level (total variation distance over the 1-5 shares)
+    pattern_similarity = 1 - 0.5 * np.abs(ctx1["rating_shares"] - ctx2["rating_shares"]).sum()
 
-    return {
-        "user_id": user.id,
-        "book_ids": book_ids,
-        "top_book_ids": top_book_ids,
-        "book_ratings": book_ratings,
-        "genre_weights": genre_weights,
-        "author_weights": author_weights,
-        "rating_dist": rating_dist,
-        "years_weighted": years_weighted,
-        "total_books": len(book_ids),
-    }
+    # Average difference
+    avg_similarity = 1 - abs(ctx1["rating_mean"] - ctx2["rating_mean"]) / 4.0
 
+    return float(pattern_similarity * 0.7 + avg_similarity * 0.3)
 
-def _calculate_rating_pattern_similarity_from_context(ctx1, ctx2):
-    """Compare rating distribution patterns using pre-built contexts"""
-    user1_dist = ctx1["rating_dist"]
-    user2_dist = ctx2["rating_dist"]
 
-    if not user1_dist or not user2_dist:
-        return 0.5  # Neutral similarity
+def _batch_rating_pattern_similarities(target_ctx, contexts):
+    """
+    _calculate_rating_pattern_similarity_from_context of target_ctx against every context, as
+    one (n, 5) matrix pass over the precomputed rating shares. Returns a float array.
+    """
+    similarities = np.full(len(contexts), 0.5)
+    if target_ctx["rating_mean"] is None:
+        return similarities
 
-    total1 = sum(user1_dist.values())
-    total2 = sum(user2_dist.values())
+    rated = [i for i, ctx in enumerate(contexts) if ctx["rating_mean"] is not None]
+    if not rated:
+        return similarities
 
-    # Compare proportions at each rating level
-    pattern_diff = sum(abs(user1_dist.get(r, 0) / total1 - user2_dist.get(r, 0) / total2) for r in range(1, 6)) / 2
+    shares = np.array([contexts[i]["rating_shares"] for i in rated])
+    means = np.array([contexts[i]["rating_mean"] for i in rated])
 
-    pattern_similarity = 1 - pattern_diff
+    pattern_similarity = 1 - 0.5 * np.abs(shares - target_ctx["rating_shares"]).sum(axis=1)
+    avg_similarity = 1 - np.abs(means - target_ctx["rating_mean"]) / 4.0
+    similarities[rated] = pattern_similarity * 0.7 + avg_similarity * 0.3
+    return similarities
 
-    # Average difference
-    ratings1 = [r for r, count in user1_dist.items() for _ in range(count)]
-    ratings2 = [r for r, count in user2_dist.items() for _ in range(count)]
 
-    if ratings1 and ratings2:
-        avg1 = sum(ratings1) / len(ratings1)
-        avg2 = sum(ratings2) / len(ratings2)
-        avg_similarity = 1 - abs(avg1 - avg2) / 4.0
-    else:
-        avg_similarity = 0.5
+def _shared_rating_correlation(ratings1, ratings2, shared_books):
+    """
+    Pearson correlation of two {book_id: rating} maps over shared_books, rescaled from
+    [-1, 1] to [0, 1]. Returns None when either side has no rating variance.
+    """
+    count = len(shared_books)
+    centered1 = np.fromiter((ratings1[book_id] for book_id in shared_books), dtype=np.float64, count=count)
+    centered2 = np.fromiter((ratings2[book_id] for book_id in shared_books), dtype=np.float64, count=count)
+    centered1 -= centered1.mean()
+    centered2 -= centered2.mean()
+
+    # Product of the two norms is zero exactly when either user rated every shared book the same
+    denominator = np.sqrt(np.dot(centered1, centered1) * np.dot(centered2, centered2))
+    if denominator == 0:
+        return None
 
-    return pattern_similarity * 0.7 + avg_similarity * 0.3
+    correlation = np.dot(centered1, centered2) / denominator
+    return float((correlation + 1) / 2)
 
 
-def _calculate_shared_book_correlation_from_context(ctx1, ctx2):
+def _shared_book_correlation(ratings1, ratings2):
     """
-    Pearson correlation using pre-built contexts.
-    Returns (correlation, shared_count) tuple.
+    Pearson correlation of two {book_id: rating} maps over the books both rated.
+    Returns (correlation, shared_count) tuple; correlation is None below 3 shared ratings.
     """
-    ratings1 = ctx1["book_ratings"]
-    ratings2 = ctx2["book_ratings"]
+    # Fewer than 3 ratings on either side can never reach 3 shared ones; skip building the intersection
+    if len(ratings1) < 3 or len(ratings2) < 3:
+        return None, 0
 
-    shared_books = set(ratings1.keys()) & set(ratings2.keys())
+    # Intersecting the dict views directly probes the smaller side instead of copying both key sets
+    shared_books = ratings1.keys() & ratings2.keys()
 
     if len(shared_books) < 3:
         return None, len(shared_books)
 
-    r1_list = [ratings1[book_id] for book_id in shared_books]
-    r2_list = [ratings2[book_id] for book_id in shared_books]
+    return _shared_rating_correlation(ratings1, ratings2, shared_books), len(shared_books)
 
-    mean1 = np.mean(r1_list)
-    mean2 = np.mean(r2_list)
 
-    numerator = sum((r1 - mean1) * (r2 - mean2) for r1, r2 in zip(r1_list, r2_list))
-    denom1 = sum((r1 - mean1) ** 2 for r1 in r1_list) ** 0.5
-    denom2 = sum((r2 - mean2) ** 2 for r2 in r2_list) ** 0.5
+def _book_overlap(books1, books2):
+    """(shared_count, jaccard) of two book id sets."""
+    # |A ∪ B| = |A| + |B| - |A ∩ B|: only the intersection set is ever built
+    shared_count = len(books1 & books2)
+    union_count = len(books1) + len(books2) - shared_count
+    return shared_count, shared_count / union_count if union_count else 0
 
-    if denom1 == 0 or denom2 == 0:
-        return None, len(shared_books)
 
-    correlation = numerator / (denom1 * denom2)
-    normalized_correlation = (correlation + 1) / 2
+def _top_overlap(top1, top2):
+    """Share of top books in common, relative to the longer top-book list."""
+    return len(top1 & top2) / max(len(top1), len(top2), 1) if (top1 or top2) else 0
+
 
-    return normalized_correlation, len(shared_books)
+def _decade_distribution(decade_weights):
+    """Normalize {decade: weight} to shares, e.g. {1990: 0.25, 2010: 0.75}."""
+    total = sum(decade_weights.values())
+    return {k: v / total for k, v in decade_weights.items()}
 
 
 def _calculate_reading_era_similarity_from_context(ctx1, ctx2):
     """Compare publication year preferences using pre-built contexts"""
-    user1_years = ctx1["years_weighted"]
-    user2_years = ctx2["years_weighted"]
+    user1_decades = ctx1["decade_dist"]
+    user2_decades = ctx2["decade_dist"]
 
-    if not user1_years or not user2_years:
+    if not user1_decades or not user2_decades:
         return 0.5
 
-    def get_decade_distribution(years):
-        decades = Counter([(y // 10) * 10 for y in years])
-        total = sum(decades.values())
-        return {k: v / total for k, v in decades.items()}
-
-    user1_decades = get_decade_distribution(user1_years)
-    user2_decades = get_decade_distribution(user2_years)
-
     all_decades = set(user1_decades.keys()) | set(user2_decades.keys())
     similarity = 1 - sum(abs(user1_decades.get(d, 0) - user2_decades.get(d, 0)) for d in all_decades) / 2
 
     return similarity
 
 
-def calculate_user_similarity_from_context(ctx1, ctx2):
+def _batch_era_similarities(target_ctx, contexts):
+    """
+    _calculate_reading_era_similarity_from_context of target_ctx against every context, as a
+    float array. Each decade_dist sums to 1, so a context's share outside the target's decades
+    is 1 minus its share inside them: projecting onto the target's decades is enough.
+    """
+    similarities = np.full(len(contexts), 0.5)
+    target_decades = target_ctx["decade_dist"]
+    if not target_decades:
+        return similarities
+
+    binned = [i for i, ctx in enumerate(contexts) if ctx["decade_dist"]]
+    if not binned:
+        return similarities
+
+    decades = list(target_decades)
+    shares = np.array([[contexts[i]["decade_dist"].get(d, 0) for d in decades] for i in binned])
+    target_shares = np.array([target_decades[d] for d in decades])
+
+    distance = np.abs(shares - target_shares).sum(axis=1) + (1 - shares.sum(axis=1))
+    similarities[binned] = 1 - distance / 2
+    return similarities
+
+
+def calculate_user_similarity_from_context(
+    ctx1, ctx2, genre_similarity=None, author_similarity=None, rating_pattern_similarity=None, era_similarity=None
+):
     """
     OPTIMIZED: Calculate similarity using pre-built contexts.
     This avoids N+1 queries by using pre-computed data.
+    genre/author/rating_pattern/era similarities may be passed in when already computed in a batch.
     """
     components = {}
     weights = {}
 
     # 1. Shared book correlation
-    correlation, shared_rated_count = _calculate_shared_book_correlation_from_context(ctx1, ctx2)
+    correlation, shared_rated_count = _shared_book_correlation(ctx1["book_ratings"], ctx2["book_ratings"])
     if correlation is not None and shared_rated_count >= 5:
         components["shared_correlation"] = correlation
         confidence = min(shared_rated_count / 20, 1.0)
@@ -206,31 +304,39 @@ def calculate_user_similarity_from_context(ctx1, ctx2):
         shared_rated_count = shared_rated_count if correlation is not None else 0
 
     # 2. Jaccard (book overlap)
-    intersection = ctx1["book_ids"] & ctx2["book_ids"]
-    union = ctx1["book_ids"] | ctx2["book_ids"]
-    components["jaccard"] = len(intersection) / len(union) if union else 0
+    shared_count, components["jaccard"] = _book_overlap(ctx1["book_ids"], ctx2["book_ids"])
     weights["jaccard"] = 0.15 if correlation is not None else 0.25
 
     # 3. Top books overlap
-    top1 = ctx1["top_book_ids"]
-    top2 = ctx2["top_book_ids"]
-    components["top_overlap"] = len(top1 & top2) / max(len(top1), len(top2), 1) if (top1 or top2) else 0
+    components["top_overlap"] = _top_overlap(ctx1["top_book_ids"], ctx2["top_book_ids"])
     weights["top_overlap"] = 0.20
 
     # 4. Genre similarity
-    components["genre_similarity"] = _calculate_cosine_similarity(ctx1["genre_weights"], ctx2["genre_weights"])
+    if genre_similarity is None:
+        genre_similarity = _calculate_cosine_similarity(
+            ctx1["genre_weights"], ctx2["genre_weights"], ctx1["genre_norm"], ctx2["genre_norm"]
+        )
+    components["genre_similarity"] = genre_similarity
     weights["genre_similarity"] = 0.15
 
     # 5. Author similarity
-    components["author_similarity"] = _calculate_cosine_similarity(ctx1["author_weights"], ctx2["author_weights"])
+    if author_similarity is None:
+        author_similarity = _calculate_cosine_similarity(
+            ctx1["author_weights"], ctx2["author_weights"], ctx1["author_norm"], ctx2["author_norm"]
+        )
+    components["author_similarity"] = author_similarity
     weights["author_similarity"] = 0.15
 
     # 6. Rating pattern similarity
-    components["rating_pattern"] = _calculate_rating_pattern_similarity_from_context(ctx1, ctx2)
+    if rating_pattern_similarity is None:
+        rating_pattern_similarity = _calculate_rating_pattern_similarity_from_context(ctx1, ctx2)
+    components["rating_pattern"] = rating_pattern_similarity
     weights["rating_pattern"] = 0.08
 
     # 7. Publication era similarity
-    components["era_similarity"] = _calculate_reading_era_similarity_from_context(ctx1, ctx2)
+    if era_similarity is None:
+        era_similarity = _calculate_reading_era_similarity_from_context(ctx1, ctx2)
+    components["era_similarity"] = era_similarity
     weights["era_similarity"] = 0.07
 
     # Normalize weights
@@ -244,7 +350,7 @@ def calculate_user_similarity_from_context(ctx1, ctx2):
         "similarity_score": final_similarity,
         "components": components,
         "weights_used": weights,
-        "shared_books_count": len(intersection),
+        "shared_books_count": shared_count,
         "shared_rated_count": shared_rated_count,
         "total_books_user1": ctx1["total_books"],
         "total_books_user2": ctx2["total_books"],
@@ -257,80 +363,181 @@ def calculate_user_similarity(user1, user2):
     Uses adaptive weighting based on data availability.
     NOTE: For bulk comparisons, use calculate_user_similarity_from_context instead.
     """
-    # Build contexts and use optimized function
-    ctx1 = _build_user_context_for_similarity(user1)
-    ctx2 = _build_user_context_for_similarity(user2)
-    return calculate_user_similarity_from_context(ctx1, ctx2)
+    # Both contexts come from the per-user context cache (dropped on any library change), and
+    # any misses are built in one bulk read; caching per user rather than per pair keeps the
+    # cache linear in users
+    contexts = _get_cached_user_contexts([user1, user2])
+    return calculate_user_similarity_from_context(contexts[user1.id], contexts[user2.id])
+
+
+def _build_similarity_context(user_id, user_book_rows, genre_weights):
+    """
+    One user's similarity context from their _SIMILARITY_USERBOOK_FIELDS rows and their
+    genre weights (see _bulk_build_user_contexts).
+    """
+    book_ids = set()
+    top_book_ids = set()
+    book_ratings = {}
+    author_weights = Counter()
+    ratings_list = []
+    decade_weights = Counter()
+
+    for _, book_id, rating, is_top_book, publish_year, author_name in user_book_rows:
+        book_ids.add(book_id)
+
+        if is_top_book:
+            top_book_ids.add(book_id)
+
+        if rating:
+            book_ratings[book_id] = rating
+            ratings_list.append(rating)
+
+        weight = rating if rating else 3
+
+        author_weights[author_name] += weight
+
+        if publish_year:
+            decade_weights[(publish_year // 10) * 10] += weight
+
+    rating_dist = Counter(ratings_list)
+    rating_shares, rating_mean = _rating_profile(rating_dist)
+
+    return {
+        "user_id": user_id,
+        "book_ids": book_ids,
+        "top_book_ids": top_book_ids,
+        "book_ratings": book_ratings,
+        "genre_weights": genre_weights,
+        "author_weights": author_weights,
+        "rating_dist": rating_dist,
+        "rating_shares": rating_shares,
+        "rating_mean": rating_mean,
+        # Aggregated once here rather than on every pairwise comparison
+        "decade_dist": _decade_distribution(decade_weights) if decade_weights else {},
+        "genre_norm": _counter_norm(genre_weights),
+        "author_norm": _counter_norm(author_weights),
+        "total_books": len(book_ids),
+    }
+
+
+def _empty_similarity_context(user_id):
+    """
+    What _build_similarity_context returns for a reader with no books, without walking rows or
+    computing a rating profile and norms. Containers are fresh per call so no two contexts share them.
+    """
+    return {
+        "user_id": user_id,
+        "book_ids": set(),
+        "top_book_ids": set(),
+        "book_ratings": {},
+        "genre_weights": Counter(),
+        "author_weights": Counter(),
+        "rating_dist": Counter(),
+        "rating_shares": None,
+        "rating_mean": None,
+        "decade_dist": {},
+        "genre_norm": 0.0,
+        "author_norm": 0.0,
+        "total_books": 0,
+    }
 
 
 def _bulk_build_user_contexts(user_ids):
     """
     OPTIMIZED: Build contexts for multiple users with just 2 queries.
+    Each context holds the user's book/top-book ids, ratings, genre and author weights and
+    rating/decade distributions, so pairwise comparisons never touch the database.
     Returns dict of {user_id: context}
     """
     if not user_ids:
         return {}
 
-    # Single query to get all user books with relations
+    # Genre weights summed per (user, genre) in the database instead of prefetching every
+    # book's genres; same per-book weight as _build_similarity_context (the rating, else 3),
+    # canonicalized here
+    genre_weights_by_user = defaultdict(Counter)
+    genre_rows = (
+        UserBook.objects.filter(user_id__in=user_ids, book__genres__isnull=False)
+        .values_list("user_id", "book__genres__name")
+        .annotate(
+            weight=Sum(
+                Case(When(user_rating__gt=0, then=F("user_rating")), default=Value(3), output_field=IntegerField())
+            )
+        )
+        .order_by()
+    )
+    for user_id, genre_name, weight in genre_rows:
+        genre_weights_by_user[user_id][CANONICAL_GENRE_MAP.get(genre_name, genre_name)] += weight
+
+    # Single query for all user books with the book/author columns joined in, streamed in
+    # chunks and ordered by user (the (user, book) unique index) so each context is built as
+    # soon as its user's rows have passed: no per-user row lists are ever held
     all_user_books = (
         UserBook.objects.filter(user_id__in=user_ids)
-        .select_related("book", "book__author")
-        .prefetch_related("book__genres")
+        .values_list(*_SIMILARITY_USERBOOK_FIELDS)
+        .order_by("user_id")
+        .iterator(chunk_size=2000)
     )
+    built = {
+        user_id: _build_similarity_context(user_id, rows, genre_weights_by_user.get(user_id, Counter()))
+        for user_id, rows in groupby(all_user_books, key=itemgetter(0))
+    }
 
-    # Group by user_id
-    books_by_user = defaultdict(list)
-    for ub in all_user_books:
-        books_by_user[ub.user_id].append(ub)
-
-    # Build contexts for each user
-    contexts = {}
-    for user_id in user_ids:
-        user_books_list = books_by_user.get(user_id, [])
-
-        book_ids = set()
-        top_book_ids = set()
-        book_ratings = {}
-        genre_weights = Counter()
-        author_weights = Counter()
-        ratings_list = []
-        years_weighted = []
+    # Users without any books still get an (empty) context, in the caller's order
+    return {
+        user_id: built[user_id] if user_id in built else _empty_similarity_context(user_id)
+        for user_id in user_ids
+    }
 
-        for ub in user_books_list:
-            book_id = ub.book_id
-            book_ids.add(book_id)
 
-            if ub.is_top_book:
-                top_book_ids.add(book_id)
+def _similarity_context_cache_key(user_id):
+    return f"similarity_ctx_v{SIMILARITY_CONTEXT_VERSION}_{user_id}"
 
-            rating = ub.user_rating
-            if rating:
-                book_ratings[book_id] = rating
-                ratings_list.append(rating)
 
-            weight = rating if rating else 3
+def _get_cached_user_contexts(users):
+    """
+    Like _bulk_build_user_contexts, but serves contexts from cache where possible.
+    Expects users loaded with select_related("userprofile"). Each entry records the
+    userprofile.last_updated it was built at and is rebuilt once that moves (a DNA
+    re-upload); UserBook writes delete the entry outright.
+    Returns dict of {user_id: context}
+    """
+    from ..cache_utils import safe_cache_get_many, safe_cache_set_many
 
-            for genre in ub.book.genres.all():
-                genre_weights[CANONICAL_GENRE_MAP.get(genre.name, genre.name)] += weight
+    if not users:
+        return {}
 
-            author_weights[ub.book.author.normalized_name] += weight
+    keys_by_user_id = {u.id: _similarity_context_cache_key(u.id) for u in users}
+    stamps_by_user_id = {u.id: u.userprofile.last_updated.timestamp() for u in users}
+    cached = safe_cache_get_many(list(keys_by_user_id.values()))
+
+    fresh = {}
+    for user_id, key in keys_by_user_id.items():
+        entry = cached.get(key)
+        if isinstance(entry, dict) and entry.get("last_updated") == stamps_by_user_id[user_id]:
+            fresh[user_id] = entry["context"]
+
+    missing_ids = [user_id for user_id in keys_by_user_id if user_id not in fresh]
+    built = {}
+    if missing_ids:
+        built = _bulk_build_user_contexts(missing_ids)
+        safe_cache_set_many(
+            {
+                keys_by_user_id[uid]: {"last_updated": stamps_by_user_id[uid], "context": ctx}
+                for uid, ctx in built.items()
+            },
+            SIMILARITY_CONTEXT_CACHE_TTL,
+        )
 
-            if ub.book.publish_year:
-                years_weighted.extend([ub.book.publish_year] * int(weight))
+    # Keep the caller's ordering so downstream tie-breaks match the uncached path
+    return {user_id: built[user_id] if user_id in built else fresh[user_id] for user_id in keys_by_user_id}
 
-        contexts[user_id] = {
-            "user_id": user_id,
-            "book_ids": book_ids,
-            "top_book_ids": top_book_ids,
-            "book_ratings": book_ratings,
-            "genre_weights": genre_weights,
-            "author_weights": author_weights,
-            "rating_dist": Counter(ratings_list),
-            "years_weighted": years_weighted,
-            "total_books": len(book_ids),
-        }
 
-    return contexts
+def _get_user_context_for_similarity(user):
+    """Cached _build_user_context_for_similarity; users without a profile are built directly."""
+    if not hasattr(user, "userprofile"):
+        return _build_user_context_for_similarity(user)
+    return _get_cached_user_contexts([user])[user.id]
 
 
 def find_similar_users(user, top_n=30, min_similarity=0.15):
@@ -339,30 +546,55 @@ def find_similar_users(user, top_n=30, min_similarity=0.15):
     Returns list of (user, similarity_data) tuples sorted by similarity.
     OPTIMIZED: Uses bulk loading to avoid N+1 queries.
     """
-    from ..cache_utils import safe_cache_get, safe_cache_set
+    from ..cache_utils import (
+        claim_user_version,
+        get_user_versions,
+        safe_cache_get_many,
+        safe_cache_set,
+        user_version_key,
+    )
 
+    # The entry records the version tokens of the user and each listed neighbour. It is served only
+    # while all of them still match; a missing token (never set, evicted, flushed) is a miss.
     cache_key = f"similar_users_{user.id}"
-    cached_result = safe_cache_get(cache_key)
-    if cached_result is not None:
-        return cached_result
-
-    # Build current user's context ONCE
-    current_user_ctx = _build_user_context_for_similarity(user)
-
-    if not current_user_ctx["book_ids"]:
-        return []
-
-    # Find candidate users who share books with current user
-    users_with_shared_books = list(
-        User.objects.exclude(id=user.id)
-        .select_related("userprofile")
-        .filter(
-            userprofile__dna_data__isnull=False,
-            userprofile__visible_in_recommendations=True,
-            user_books__book_id__in=current_user_ctx["book_ids"],
+    cached = safe_cache_get_many([cache_key, user_version_key(user.id)])
+    own_version = cached.get(user_version_key(user.id))
+    cached_entry = cached.get(cache_key)
+    if own_version is not None and isinstance(cached_entry, dict) and "versions" in cached_entry:
+        entry_versions = cached_entry["versions"]
+        if entry_versions.get(user.id) == own_version:
+            neighbour_ids = [other.id for other, _ in cached_entry["result"]]
+            current_versions = get_user_versions(neighbour_ids) if neighbour_ids else {}
+            if all(
+                user_id in current_versions and current_versions[user_id] == entry_versions.get(user_id)
+                for user_id in neighbour_ids
+            ):
+                return cached_entry["result"]
+
+    # Find candidate users who share books with current user. Counting matches per reader over
+    # the (book, is_top_book) index keeps the 500 with the most overlap instead of an arbitrary 500.
+    # The user's own books stay a subquery so their context can load together with the candidates'
+    user_book_ids = UserBook.objects.filter(user_id=user.id).values("book_id")
+    shared_book_counts = (
+        UserBook.objects.filter(
+            book_id__in=user_book_ids,
+            user__userprofile__dna_data__isnull=False,
+            user__userprofile__visible_in_recommendations=True,
         )
-        .distinct()[:500]
+        .exclude(user_id=user.id)
+        .values("user_id")
+        .annotate(shared=Count("id"))
+        .order_by("-shared", "user_id")[:500]
+    )
+    candidate_ids = [row["user_id"] for row in shared_book_counts]
+    users_by_id = (
+        User.objects.select_related("userprofile").only(*SIMILARITY_CANDIDATE_FIELDS).in_bulk(candidate_ids)
     )
+    users_with_shared_books = [users_by_id[user_id] for user_id in candidate_ids]
+
+    # Nobody shares a book: only widen to the fallback pool if the user has a library at all
+    if not users_with_shared_books and not user_book_ids.exists():
+        return []
 
     # Fallback if not enough candidates
     if len(users_with_shared_books) < top_n * 2:
@@ -371,6 +603,7 @@ def find_similar_users(user, top_n=30, min_similarity=0.15):
             User.objects.exclude(id=user.id)
             .exclude(id__in=existing_ids)
             .select_related("userprofile")
+            .only(*SIMILARITY_CANDIDATE_FIELDS)
             .filter(userprofile__dna_data__isnull=False, userprofile__visible_in_recommendations=True)[:200]
         )
         all_users = users_with_shared_books + additional_users
@@ -380,31 +613,65 @@ def find_similar_users(user, top_n=30, min_similarity=0.15):
     if not all_users:
         return []
 
-    # BULK LOAD all candidate user contexts in ONE query
-    candidate_user_ids = [u.id for u in all_users]
-    candidate_contexts = _bulk_build_user_contexts(candidate_user_ids)
-
     # Create user lookup for results
     user_lookup = {u.id: u for u in all_users}
 
+    # Read versions before loading any context: a write landing after this point bumps a token,
+    # so an entry built from the pre-write context is stored under the old token and never served
+    versions = get_user_versions([user.id, *user_lookup])
+
+    # BULK LOAD the current user's and every candidate's context in ONE pass
+    candidate_contexts = _get_cached_user_contexts([user, *all_users])
+    current_user_ctx = candidate_contexts.pop(user.id)
+
+    # Skip users with no books
+    scored_contexts = [(user_id, ctx) for user_id, ctx in candidate_contexts.items() if ctx["book_ids"]]
+
+    # Genre and author cosines for every candidate in one batched pass each
+    genre_similarities = _batch_cosine_similarities(
+        current_user_ctx["genre_weights"],
+        [ctx["genre_weights"] for _, ctx in scored_contexts],
+        [ctx["genre_norm"] for _, ctx in scored_contexts],
+    ).tolist()
+    author_similarities = _batch_cosine_similarities(
+        current_user_ctx["author_weights"],
+        [ctx["author_weights"] for _, ctx in scored_contexts],
+        [ctx["author_norm"] for _, ctx in scored_contexts],
+    ).tolist()
+    candidate_contexts = [ctx for _, ctx in scored_contexts]
+    rating_pattern_similarities = _batch_rating_pattern_similarities(current_user_ctx, candidate_contexts).tolist()
+    era_similarities = _batch_era_similarities(current_user_ctx, candidate_contexts).tolist()
+
     # Calculate similarities using pre-built contexts (NO additional queries!)
     similarities = []
-    for user_id, other_ctx in candidate_contexts.items():
-        if not other_ctx["book_ids"]:  # Skip users with no books
-            continue
-
-        similarity_data = calculate_user_similarity_from_context(current_user_ctx, other_ctx)
+    for (user_id, other_ctx), genre_similarity, author_similarity, rating_pattern_similarity, era_similarity in zip(
+        scored_contexts, genre_similarities, author_similarities, rating_pattern_similarities, era_similarities
+    ):
+        similarity_data = calculate_user_similarity_from_context(
+            current_user_ctx,
+            other_ctx,
+            genre_similarity=genre_similarity,
+            author_similarity=author_similarity,
+            rating_pattern_similarity=rating_pattern_similarity,
+            era_similarity=era_similarity,
+        )
 
         if similarity_data["similarity_score"] >= min_similarity:
             other_user = user_lookup[user_id]
             similarities.append((other_user, similarity_data))
 
-    # Sort by similarity score (highest first)
-    similarities.sort(key=lambda x: x[1]["similarity_score"], reverse=True)
-    result = similarities[:top_n]
-
-    # Cache for 30 minutes
-    safe_cache_set(cache_key, result, 1800)
+    # Top-n by similarity score (highest first) without sorting the whole candidate list
+    result = heapq.nlargest(top_n, similarities, key=lambda x: x[1]["similarity_score"])
+
+    # Users without a token yet get one claimed now; losing a claim race means a write raced
+    # this computation, so the result is returned but not cached
+    entry_versions = {}
+    for user_id in [user.id, *(other.id for other, _ in result)]:
+        token = versions.get(user_id) or claim_user_version(user_id)
+        if token is None:
+            return result
+        entry_versions[user_id] = token
+    safe_cache_set(cache_key, {"versions": entry_versions, "result": result}, SIMILAR_USERS_CACHE_TTL)
     return result
 
 
@@ -425,76 +692,79 @@ def get_recommendation_pool_size():
     return count
 
 
-def calculate_anonymous_similarity_with_context(anonymous_session, user_ctx):
+def calculate_anonymous_similarities_with_contexts(anonymous_session, user_ctxs):
     """
-    OPTIMIZED: Calculate similarity using pre-built user context.
-    Avoids N+1 queries when comparing anonymous session to multiple users.
+    Batched calculate_anonymous_similarity_with_context: one similarity dict per user
+    context, in order. The session's genre/author Counters are built once and their cosines
+    against every context are computed in one pass each (_batch_cosine_similarities).
     """
-    anon_books = set(anonymous_session.books_data or [])
-    anon_top_books = set(anonymous_session.top_books_data or [])
     anon_genres = _canonicalize_genre_counter(anonymous_session.genre_distribution or {})
     anon_authors = Counter(anonymous_session.author_distribution or {})
-    anon_ratings = getattr(anonymous_session, "book_ratings", None) or {}
+    genre_similarities = _batch_cosine_similarities(
+        anon_genres, [ctx["genre_weights"] for ctx in user_ctxs], [ctx["genre_norm"] for ctx in user_ctxs]
+    )
+    author_similarities = _batch_cosine_similarities(
+        anon_authors, [ctx["author_weights"] for ctx in user_ctxs], [ctx["author_norm"] for ctx in user_ctxs]
+    )
+
+    return [
+        calculate_anonymous_similarity_with_context(
+            anonymous_session, user_ctx, genre_similarity=genre_similarity, author_similarity=author_similarity
+        )
+        for user_ctx, genre_similarity, author_similarity in zip(
+            user_ctxs, genre_similarities.tolist(), author_similarities.tolist()
+        )
+    ]
 
-    user_books = user_ctx["book_ids"]
-    user_ratings = user_ctx["book_ratings"]
-    user_top = user_ctx["top_book_ids"]
-    user_genres = user_ctx["genre_weights"]
-    user_authors = user_ctx["author_weights"]
 
+def calculate_anonymous_similarity_with_context(
+    anonymous_session, user_ctx, genre_similarity=None, author_similarity=None
+):
+    """
+    OPTIMIZED: Calculate similarity using pre-built user context.
+    Avoids N+1 queries when comparing anonymous session to multiple users.
+    genre_similarity/author_similarity may be passed in when already computed in a batch.
+    """
     components = {}
     weights = {}
 
-    # 1. Shared book correlation
-    if anon_ratings and user_ratings:
-        shared_rated_books = set(anon_ratings.keys()) & set(user_ratings.keys())
-
-        if len(shared_rated_books) >= 3:
-            anon_ratings_list = [anon_ratings[book_id] for book_id in shared_rated_books]
-            user_ratings_list = [user_ratings[book_id] for book_id in shared_rated_books]
-
-            mean_anon = np.mean(anon_ratings_list)
-            mean_user = np.mean(user_ratings_list)
-
-            numerator = sum((r1 - mean_anon) * (r2 - mean_user) for r1, r2 in zip(anon_ratings_list, user_ratings_list))
-            denom_anon = sum((r1 - mean_anon) ** 2 for r1 in anon_ratings_list) ** 0.5
-            denom_user = sum((r2 - mean_user) ** 2 for r2 in user_ratings_list) ** 0.5
-
-            if denom_anon > 0 and denom_user > 0:
-                correlation = numerator / (denom_anon * denom_user)
-                normalized_correlation = (correlation + 1) / 2
-                components["shared_correlation"] = normalized_correlation
-                confidence = min(len(shared_rated_books) / 20, 1.0)
-                weights["shared_correlation"] = 0.35 * confidence
-            else:
-                weights["shared_correlation"] = 0
-        else:
-            weights["shared_correlation"] = 0
-            shared_rated_books = set()
+    # 1. Shared book correlation (session ratings are int-keyed and built once per session)
+    correlation, shared_rated_count = _shared_book_correlation(
+        anonymous_session.rating_by_book_id, user_ctx["book_ratings"]
+    )
+    if correlation is not None:
+        components["shared_correlation"] = correlation
+        confidence = min(shared_rated_count / 20, 1.0)
+        weights["shared_correlation"] = 0.35 * confidence
     else:
         weights["shared_correlation"] = 0
-        shared_rated_books = set()
+    if shared_rated_count < 3:
+        shared_rated_count = 0
 
     # 2. Jaccard similarity
-    intersection = anon_books & user_books
-    union = anon_books | user_books
-    components["jaccard"] = len(intersection) / len(union) if union else 0
-    weights["jaccard"] = 0.15 if weights.get("shared_correlation", 0) > 0 else 0.25
+    shared_count, components["jaccard"] = _book_overlap(anonymous_session.read_book_ids, user_ctx["book_ids"])
+    weights["jaccard"] = 0.15 if correlation is not None else 0.25
 
     # 3. Top books overlap (using pre-built context)
-    components["top_overlap"] = (
-        len(anon_top_books & user_top) / max(len(anon_top_books), len(user_top), 1)
-        if (anon_top_books or user_top)
-        else 0
-    )
+    components["top_overlap"] = _top_overlap(anonymous_session.top_book_ids, user_ctx["top_book_ids"])
     weights["top_overlap"] = 0.20
 
     # 4. Genre similarity (using pre-built context)
-    components["genre_similarity"] = _calculate_cosine_similarity(anon_genres, user_genres)
+    if genre_similarity is None:
+        anon_genres = _canonicalize_genre_counter(anonymous_session.genre_distribution or {})
+        genre_similarity = _calculate_cosine_similarity(
+            anon_genres, user_ctx["genre_weights"], norm2=user_ctx["genre_norm"]
+        )
+    components["genre_similarity"] = genre_similarity
     weights["genre_similarity"] = 0.15
 
     # 5. Author similarity (using pre-built context)
-    components["author_similarity"] = _calculate_cosine_similarity(anon_authors, user_authors)
+    if author_similarity is None:
+        anon_authors = Counter(anonymous_session.author_distribution or {})
+        author_similarity = _calculate_cosine_similarity(
+            anon_authors, user_ctx["author_weights"], norm2=user_ctx["author_norm"]
+        )
+    components["author_similarity"] = author_similarity
     weights["author_similarity"] = 0.15
 
     final_similarity = sum(
@@ -512,97 +782,129 @@ def calculate_anonymous_similarity_with_context(anonymous_session, user_ctx):
         "genre_similarity": components.get("genre_similarity", 0),
         "author_similarity": components.get("author_similarity", 0),
         "shared_correlation": components.get("shared_correlation"),
-        "shared_books_count": len(intersection),
-        "shared_rated_count": len(shared_rated_books),
+        "shared_books_count": shared_count,
+        "shared_rated_count": shared_rated_count,
     }
 
 
-def calculate_similarity_with_anonymized(profile_data, anon_profile, user_ctx=None):
+def _anonymized_comparison_features(profile_data, user_ctx=None):
     """
-    Calculate similarity with anonymized profile.
-    Enhanced to match quality of user-to-user comparisons.
+    The (genres, authors, top_books, rating_dist) side of an anonymized-profile comparison.
 
     Args:
         profile_data: Either a User object, AnonymousUserSession, or dict with session data
-        anon_profile: AnonymizedReadingProfile object
         user_ctx: Optional pre-built user context (for optimization)
     """
-
-    # Extract user data based on type
     if isinstance(profile_data, User):
         user = profile_data
 
         # Use pre-built context if provided (OPTIMIZATION)
         if user_ctx is not None:
-            user_genres = user_ctx["genre_weights"]
-            user_authors = user_ctx["author_weights"]
-            user_top_books = user_ctx["top_book_ids"]
-            user_rating_dist = user_ctx["rating_dist"]
-        else:
-            # Fallback: build from DNA data (no query needed)
-            dna = user.userprofile.dna_data
-
-            user_genres = Counter()
-            user_authors = Counter()
-            user_top_books = set(UserBook.objects.filter(user=user, is_top_book=True).values_list("book_id", flat=True))
-
-            # Extract from DNA data (canonicalized; += folds renamed duplicates together)
-            for genre, count in dna.get("top_genres", []):
-                user_genres[CANONICAL_GENRE_MAP.get(genre, genre)] += count
-
-            for author, count in dna.get("top_authors", []):
-                normalized = Author._normalize(author)
-                user_authors[normalized] = count
-
-            # Get rating distribution from DNA
-            user_rating_dist = Counter()
-            for rating_str, count in dna.get("ratings_distribution", {}).items():
-                user_rating_dist[int(rating_str)] = count
-
-    elif isinstance(profile_data, AnonymousUserSession):
-        # AnonymousUserSession object
-        user_genres = _canonicalize_genre_counter(profile_data.genre_distribution or {})
-        user_authors = Counter(profile_data.author_distribution or {})
-        user_top_books = set(profile_data.top_books_data or [])
-        user_rating_dist = Counter()  # Anonymous sessions may not have this
-    else:
-        # Dict with anonymous session data
-        user_genres = _canonicalize_genre_counter(profile_data.get("genre_distribution", {}))
-        user_authors = Counter(profile_data.get("author_distribution", {}))
-        user_top_books = set(profile_data.get("top_books_data", []))
-        user_rating_dist = Counter(profile_data.get("rating_distribution", {}))
-
-    # Extract anonymized profile data
-    anon_genres = _canonicalize_genre_counter(anon_profile.genre_distribution or {})
-    anon_authors = Counter(anon_profile.author_distribution or {})
-    anon_top_books = set(anon_profile.top_book_ids or [])
-    anon_rating_dist = Counter(getattr(anon_profile, "rating_distribution", None) or {})
-
-    # Calculate similarity components
-    genre_similarity = _calculate_cosine_similarity(user_genres, anon_genres)
-    author_similarity = _calculate_cosine_similarity(user_authors, anon_authors)
-
-    top_overlap = (
-        len(user_top_books & anon_top_books) / max(len(user_top_books), len(anon_top_books), 1)
-        if user_top_books or anon_top_books
-        else 0
+            return (
+                user_ctx["genre_weights"],
+                user_ctx["author_weights"],
+                user_ctx["top_book_ids"],
+                user_ctx["rating_dist"],
+            )
+
+        # Fallback: build from DNA data (no query needed)
+        dna = user.userprofile.dna_data
+
+        user_genres = Counter()
+        user_authors = Counter()
+        # Top books come from the cached similarity context rather than a query per profile
+        user_top_books = _get_user_context_for_similarity(user)["top_book_ids"]
+
+        # Extract from DNA data (canonicalized; += folds renamed duplicates together)
+        for genre, count in dna.get("top_genres", []):
+            user_genres[CANONICAL_GENRE_MAP.get(genre, genre)] += count
+
+        for author, count in dna.get("top_authors", []):
+            normalized = Author._normalize(author)
+            user_authors[normalized] = count
+
+        # Get rating distribution from DNA
+        user_rating_dist = Counter()
+        for rating_str, count in dna.get("ratings_distribution", {}).items():
+            user_rating_dist[int(rating_str)] = count
+
+        return user_genres, user_authors, user_top_books, user_rating_dist
+
+    if isinstance(profile_data, AnonymousUserSession):
+        return (
+            _canonicalize_genre_counter(profile_data.genre_distribution or {}),
+            Counter(profile_data.author_distribution or {}),
+            profile_data.top_book_ids,
+            Counter(),  # Anonymous sessions may not have this
+        )
+
+    # Dict with anonymous session data
+    return (
+        _canonicalize_genre_counter(profile_data.get("genre_distribution", {})),
+        Counter(profile_data.get("author_distribution", {})),
+        set(profile_data.get("top_books_data", [])),
+        Counter(profile_data.get("rating_distribution", {})),
     )
 
-    # Rating distribution similarity
-    rating_similarity = _calculate_cosine_similarity(user_rating_dist, anon_rating_dist)
 
-    # Weighted combination
-    final_similarity = (
-        genre_similarity * 0.30 + author_similarity * 0.25 + top_overlap * 0.25 + rating_similarity * 0.20
+def calculate_similarities_with_anonymized(profile_data, anon_profiles, user_ctx=None):
+    """
+    calculate_similarity_with_anonymized against many anonymized profiles: one similarity
+    dict per profile, in order. profile_data's side is extracted once and the genre, author
+    and rating cosines are each computed in one batched pass (_batch_cosine_similarities).
+    """
+    user_genres, user_authors, user_top_books, user_rating_dist = _anonymized_comparison_features(
+        profile_data, user_ctx
     )
 
-    return {
-        "similarity_score": final_similarity,
-        "genre_similarity": genre_similarity,
-        "author_similarity": author_similarity,
-        "top_overlap": top_overlap,
-        "rating_similarity": rating_similarity,
-    }
+    anon_top_books = [set(anon_profile.top_book_ids or []) for anon_profile in anon_profiles]
+    genre_similarities = _batch_cosine_similarities(
+        user_genres,
+        [_canonicalize_genre_counter(anon_profile.genre_distribution or {}) for anon_profile in anon_profiles],
+    ).tolist()
+    author_similarities = _batch_cosine_similarities(
+        user_authors, [Counter(anon_profile.author_distribution or {}) for anon_profile in anon_profiles]
+    ).tolist()
+    rating_similarities = _batch_cosine_similarities(
+        user_rating_dist,
+        [Counter(getattr(anon_profile, "rating_distribution", None) or {}) for anon_profile in anon_profiles],
+    ).tolist()
+
+    results = []
+    for top_books, genre_similarity, author_similarity, rating_similarity in zip(
+        anon_top_books, genre_similarities, author_similarities, rating_similarities
+    ):
+        top_overlap = _top_overlap(user_top_books, top_books)
+
+        # Weighted combination
+        final_similarity = (
+            genre_similarity * 0.30 + author_similarity * 0.25 + top_overlap * 0.25 + rating_similarity * 0.20
+        )
+
+        results.append(
+            {
+                "similarity_score": final_similarity,
+                "genre_similarity": genre_similarity,
+                "author_similarity": author_similarity,
+                "top_overlap": top_overlap,
+                "rating_similarity": rating_similarity,
+            }
+        )
+    return results
+
+
+def calculate_similarity_with_anonymized(profile_data, anon_profile, user_ctx=None):
+    """
+    Calculate similarity with anonymized profile.
+    Enhanced to match quality of user-to-user comparisons.
+    For many profiles at once, use calculate_similarities_with_anonymized.
+
+    Args:
+        profile_data: Either a User object, AnonymousUserSession, or dict with session data
+        anon_profile: AnonymizedReadingProfile object
+        user_ctx: Optional pre-built user context (for optimization)
+    """
+    return calculate_similarities_with_anonymized(profile_data, [anon_profile], user_ctx=user_ctx)[0]
 
 
 def get_match_quality_label(similarity_score):
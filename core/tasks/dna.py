@@ -134,6 +134,7 @@ def claim_anonymous_dna_task(self, user_id: int, task_id: str, session_key: str)
 
 def _create_userbooks_from_anonymous_session(user, session_key):
     """Create UserBook records from AnonymousUserSession when claiming anonymous DNA"""
+    from ..cache_utils import deferred_user_cache_invalidation
     from ..models import AnonymousUserSession, UserBook, Book
     from ..services.top_books_service import calculate_and_store_top_books
 
@@ -146,32 +147,34 @@ def _create_userbooks_from_anonymous_session(user, session_key):
             logger.warning(f"No book IDs found in AnonymousUserSession {session_key}")
             return
 
-        books_created = 0
-        for book_id in book_ids:
-            try:
-                book = Book.objects.get(pk=book_id)
-                UserBook.objects.get_or_create(user=user, book=book, defaults={})
-                books_created += 1
-            except Book.DoesNotExist:
-                logger.warning(f"Book with id {book_id} not found when creating UserBooks")
-                continue
-
-        logger.info(f"Created {books_created} UserBook records for user {user.username} from anonymous session")
-
-        if books_created > 0:
-            calculate_and_store_top_books(user, limit=5)
-            # Also mark the top books from the anonymous session if they exist
-            for position, book_id in enumerate(top_book_ids[:5], 1):
+        # Batch the per-row UserBook cache invalidation into one for the whole claim
+        with deferred_user_cache_invalidation(user.id):
+            books_created = 0
+            for book_id in book_ids:
                 try:
                     book = Book.objects.get(pk=book_id)
-                    user_book = UserBook.objects.filter(user=user, book=book).first()
-                    if user_book:
-                        user_book.is_top_book = True
-                        user_book.top_book_position = position
-                        user_book.save()
+                    UserBook.objects.get_or_create(user=user, book=book, defaults={})
+                    books_created += 1
                 except Book.DoesNotExist:
+                    logger.warning(f"Book with id {book_id} not found when creating UserBooks")
                     continue
 
+            logger.info(f"Created {books_created} UserBook records for user {user.username} from anonymous session")
+
+            if books_created > 0:
+                calculate_and_store_top_books(user, limit=5)
+                # Also mark the top books from the anonymous session if they exist
+                for position, book_id in enumerate(top_book_ids[:5], 1):
+                    try:
+                        book = Book.objects.get(pk=book_id)
+                        user_book = UserBook.objects.filter(user=user, book=book).first()
+                        if user_book:
+                            user_book.is_top_book = True
+                            user_book.top_book_position = position
+                            user_book.save()
+                    except Book.DoesNotExist:
+                        continue
+
     except AnonymousUserSession.DoesNotExist:
         logger.warning(f"AnonymousUserSession {session_key} not found when claiming DNA for user {user.username}")
     except Exception as e:
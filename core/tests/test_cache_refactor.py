@@ -12,7 +12,17 @@ from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.utils import timezone
 
-from core.cache_utils import safe_cache_delete, safe_cache_get, safe_cache_set
+from core.cache_utils import (
+    bump_user_version,
+    claim_user_version,
+    get_user_versions,
+    safe_cache_delete,
+    safe_cache_get,
+    safe_cache_get_many,
+    safe_cache_set,
+    safe_cache_set_many,
+    user_version_key,
+)
 from core.models import (
     AnonymizedReadingProfile,
     AnonymousUserSession,
@@ -51,6 +61,28 @@ class SafeCacheUtilsTests(TestCase):
         result = cache.get("test_key")
         self.assertEqual(result, {"data": 123})
 
+    def test_bump_user_version_always_issues_a_new_token(self):
+        bump_user_version(7)
+        first = get_user_versions([7])[7]
+        bump_user_version(7)
+        self.assertNotEqual(get_user_versions([7])[7], first)
+
+    def test_claim_user_version_only_when_missing(self):
+        token = claim_user_version(7)
+        self.assertEqual(cache.get(user_version_key(7)), token)
+        self.assertIsNone(claim_user_version(7))
+
+    def test_get_user_versions_omits_missing_users(self):
+        bump_user_version(1)
+        self.assertEqual(set(get_user_versions([1, 2])), {1})
+
+    @patch("core.cache_utils.cache")
+    @patch("core.cache_utils.track_redis_cache_error")
+    def test_bump_user_version_drops_token_when_set_fails(self, mock_track, mock_cache):
+        mock_cache.set.side_effect = ConnectionError("Redis down")
+        bump_user_version(7)
+        mock_cache.delete.assert_called_once_with(user_version_key(7))
+
     def test_safe_cache_delete_removes_value(self):
         cache.set("test_key", "value", 60)
         safe_cache_delete("test_key")
@@ -88,6 +120,19 @@ class SafeCacheUtilsTests(TestCase):
         mock_track.assert_called_once()
         self.assertEqual(mock_track.call_args.kwargs["operation"], "delete")
 
+    def test_safe_cache_set_many_and_get_many_round_trip(self):
+        safe_cache_set_many({"k1": 1, "k2": {"a": 2}}, 60)
+        result = safe_cache_get_many(["k1", "k2", "missing"])
+        self.assertEqual(result, {"k1": 1, "k2": {"a": 2}})
+
+    @patch("core.cache_utils.cache")
+    @patch("core.cache_utils.track_redis_cache_error")
+    def test_safe_cache_get_many_handles_exception(self, mock_track, mock_cache):
+        mock_cache.get_many.side_effect = ConnectionError("Redis down")
+        result = safe_cache_get_many(["a", "b"])
+        self.assertEqual(result, {})
+        self.assertEqual(mock_track.call_args.kwargs["operation"], "get_many")
+
 
 @override_settings(
     CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache-refactor-tests"}}
@@ -237,6 +282,318 @@ class SaveDnaInvalidationTests(TestCase):
         # US-023: dispatch is now async via .delay()
         mock_rec_task.delay.assert_called_once_with(self.user.id)
 
+    @patch("core.tasks.generate_recommendations_task")
+    def test_save_dna_bumps_last_updated(self, mock_rec_task):
+        """last_updated versions the similarity-context cache, so it must move on every save."""
+        from core.services.dna import _save_dna_to_profile
+
+        profile = self.user.userprofile
+        before = profile.last_updated
+
+        dna = {"reader_type": "Test", "user_stats": {}, "reading_vibe": [], "vibe_data_hash": "h"}
+        _save_dna_to_profile(profile, dna)
+
+        profile.refresh_from_db()
+        self.assertGreater(profile.last_updated, before)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache-refactor-tests"}}
+)
+class UserBookWriteInvalidationTests(TestCase):
+    """UserBook saves and deletes drop the owner's recommendation caches without waiting for the TTL."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="writeuser", password="test123")
+        self.book = Book.objects.create(title="Write Book", author=Author.objects.create(name="Write Author"))
+
+    def _seed(self):
+        cache.set(f"user_recommendations_{self.user.id}", [{"fake": "rec"}], 900)
+        cache.set(f"similar_users_{self.user.id}", [("fake", "data")], 1800)
+
+    def test_userbook_save_invalidates(self):
+        self._seed()
+        UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+
+        self.assertIsNone(cache.get(f"user_recommendations_{self.user.id}"))
+        self.assertIsNone(cache.get(f"similar_users_{self.user.id}"))
+
+    def test_userbook_delete_invalidates(self):
+        user_book = UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+        self._seed()
+        user_book.delete()
+
+        self.assertIsNone(cache.get(f"user_recommendations_{self.user.id}"))
+        self.assertIsNone(cache.get(f"similar_users_{self.user.id}"))
+
+    def test_other_users_caches_untouched(self):
+        other = User.objects.create_user(username="otheruser", password="test123")
+        cache.set(f"user_recommendations_{other.id}", [{"fake": "rec"}], 900)
+
+        UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+
+        self.assertIsNotNone(cache.get(f"user_recommendations_{other.id}"))
+
+    def test_raw_save_skips_invalidation(self):
+        self._seed()
+        # Fixture loading saves raw rows, which skip auto_now; supply date_added like a fixture would
+        user_book = UserBook(user=self.user, book=self.book, user_rating=4, date_added=timezone.now())
+        user_book.save_base(raw=True)
+
+        self.assertIsNotNone(cache.get(f"user_recommendations_{self.user.id}"))
+
+    @patch("core.cache_utils.invalidate_user_caches")
+    def test_deferred_block_invalidates_once(self, mock_invalidate):
+        from core.cache_utils import deferred_user_cache_invalidation
+
+        other_book = Book.objects.create(title="Second Book", author=self.book.author)
+        with deferred_user_cache_invalidation(self.user.id):
+            UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+            UserBook.objects.create(user=self.user, book=other_book, user_rating=3)
+            UserBook.objects.filter(user=self.user, book=other_book).delete()
+            mock_invalidate.assert_not_called()
+
+        mock_invalidate.assert_called_once_with(self.user.id)
+
+    @patch("core.cache_utils.invalidate_user_caches")
+    def test_deferred_block_leaves_other_users_per_row(self, mock_invalidate):
+        from core.cache_utils import deferred_user_cache_invalidation
+
+        other = User.objects.create_user(username="otherwriter", password="test123")
+        with deferred_user_cache_invalidation(self.user.id):
+            UserBook.objects.create(user=other, book=self.book, user_rating=4)
+            mock_invalidate.assert_called_once_with(other.id)
+
+    def test_userbook_has_no_post_delete_receiver(self):
+        """A post_delete receiver would disable fast delete for the re-upload stale-row cleanup."""
+        from django.db.models.signals import post_delete
+
+        self.assertFalse(post_delete.has_listeners(UserBook))
+
+    def _cache_similar_users(self, reader, neighbour):
+        """Seed reader's similar_users_ entry listing neighbour, stamped with both users' current tokens."""
+        for user_id in (reader.id, neighbour.id):
+            claim_user_version(user_id)
+        versions = get_user_versions([reader.id, neighbour.id])
+        cache.set(f"similar_users_{reader.id}", {"versions": versions, "result": [(neighbour, {"stale": True})]})
+
+    def test_cached_similar_users_served_while_versions_match(self):
+        from core.services.user_similarity_service import find_similar_users
+
+        other = User.objects.create_user(username="versionuser", password="test123")
+        self._cache_similar_users(other, self.user)
+
+        self.assertEqual(find_similar_users(other), [(self.user, {"stale": True})])
+
+    def test_neighbour_library_write_stales_cached_list(self):
+        """A change to a listed neighbour's library invalidates the reader's cached list."""
+        from core.services.user_similarity_service import find_similar_users
+
+        other = User.objects.create_user(username="versionuser", password="test123")
+        self._cache_similar_users(other, self.user)
+
+        UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+
+        self.assertEqual(find_similar_users(other), [])
+
+    def test_unrelated_library_write_keeps_cached_list(self):
+        from core.services.user_similarity_service import find_similar_users
+
+        other = User.objects.create_user(username="versionuser", password="test123")
+        bystander = User.objects.create_user(username="bystander", password="test123")
+        self._cache_similar_users(other, self.user)
+
+        UserBook.objects.create(user=bystander, book=self.book, user_rating=4)
+
+        self.assertEqual(find_similar_users(other), [(self.user, {"stale": True})])
+
+    def test_missing_version_token_is_a_miss(self):
+        """An evicted or flushed token must never read as a match."""
+        from core.services.user_similarity_service import find_similar_users
+
+        other = User.objects.create_user(username="versionuser", password="test123")
+        self._cache_similar_users(other, self.user)
+        cache.delete(user_version_key(self.user.id))
+
+        self.assertEqual(find_similar_users(other), [])
+
+    def test_write_during_context_load_is_not_cached_as_fresh(self):
+        """A library write racing the context load must not be stored under the post-write token."""
+        from core.services import user_similarity_service
+        from core.services.user_similarity_service import find_similar_users
+
+        other = User.objects.create_user(username="versionuser", password="test123")
+        for reader in (self.user, other):
+            reader.userprofile.dna_data = {"top_genres": []}
+            reader.userprofile.save()
+            UserBook.objects.create(user=reader, book=self.book, user_rating=5)
+        load_contexts = user_similarity_service._get_cached_user_contexts
+
+        def load_then_write(users):
+            contexts = load_contexts(users)
+            # The racing write lands after the contexts were read
+            bump_user_version(other.id)
+            bump_user_version(self.user.id)
+            return contexts
+
+        with patch.object(user_similarity_service, "_get_cached_user_contexts", side_effect=load_then_write):
+            find_similar_users(other)
+
+        entry = cache.get(f"similar_users_{other.id}")
+        current = get_user_versions([other.id])
+        self.assertTrue(entry is None or entry["versions"][other.id] != current[other.id])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache-refactor-tests"}}
+)
+class SimilarityContextCacheTests(TestCase):
+    """Per-user similarity contexts are cached under a key versioned by userprofile.last_updated."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ctxuser", password="test123")
+        author = Author.objects.create(name="Ctx Author")
+        self.book = Book.objects.create(title="Ctx Book", author=author, publish_year=2001)
+        UserBook.objects.create(user=self.user, book=self.book, user_rating=4)
+
+    def _load_users(self):
+        return list(User.objects.select_related("userprofile").filter(id=self.user.id))
+
+    def test_second_call_is_served_from_cache(self):
+        from core.services.user_similarity_service import _get_cached_user_contexts
+
+        first = _get_cached_user_contexts(self._load_users())
+        users = self._load_users()
+        with self.assertNumQueries(0):
+            second = _get_cached_user_contexts(users)
+
+        self.assertEqual(second[self.user.id]["book_ids"], first[self.user.id]["book_ids"])
+
+    def test_profile_save_rotates_key(self):
+        from core.services.user_similarity_service import _get_cached_user_contexts
+
+        _get_cached_user_contexts(self._load_users())
+
+        other_book = Book.objects.create(title="Ctx Book 2", author=self.book.author)
+        UserBook.objects.create(user=self.user, book=other_book, user_rating=5)
+        self.user.userprofile.save()
+
+        contexts = _get_cached_user_contexts(self._load_users())
+        self.assertEqual(contexts[self.user.id]["book_ids"], {self.book.id, other_book.id})
+
+    def test_userbook_write_drops_context_without_profile_save(self):
+        from core.services.user_similarity_service import _get_cached_user_contexts
+
+        _get_cached_user_contexts(self._load_users())
+
+        other_book = Book.objects.create(title="Ctx Book 3", author=self.book.author)
+        UserBook.objects.create(user=self.user, book=other_book, user_rating=2)
+
+        contexts = _get_cached_user_contexts(self._load_users())
+        self.assertEqual(contexts[self.user.id]["book_ids"], {self.book.id, other_book.id})
+
+    def test_target_user_context_shares_cache(self):
+        from core.services.user_similarity_service import _get_user_context_for_similarity
+
+        first = _get_user_context_for_similarity(self._load_users()[0])
+        user = self._load_users()[0]
+        with self.assertNumQueries(0):
+            second = _get_user_context_for_similarity(user)
+
+        self.assertEqual(second["decade_dist"], first["decade_dist"])
+        self.assertEqual(first["decade_dist"], {2000: 1.0})
+
+    def test_find_similar_users_builds_target_with_candidates(self):
+        from core.services.user_similarity_service import _get_user_context_for_similarity, find_similar_users
+
+        other = User.objects.create_user(username="ctxother", password="test123")
+        other.userprofile.dna_data = {"top_genres": []}
+        other.userprofile.visible_in_recommendations = True
+        other.userprofile.save()
+        UserBook.objects.create(user=other, book=self.book, user_rating=5)
+
+        user = self._load_users()[0]
+        # Shared-book shortlist, candidate users, fallback pool, then one two-query context build
+        with self.assertNumQueries(5):
+            similar = find_similar_users(user)
+
+        self.assertEqual([similar_user.id for similar_user, _ in similar], [other.id])
+        with self.assertNumQueries(0):
+            _get_user_context_for_similarity(user)
+
+    def test_context_genre_weights_aggregated_and_canonicalized(self):
+        from core.services.user_similarity_service import _bulk_build_user_contexts
+
+        classics = Genre.objects.create(name="classics")
+        classic_fiction = Genre.objects.create(name="classic fiction")
+        self.book.genres.add(classics)
+        unrated = Book.objects.create(title="Ctx Unrated", author=self.book.author)
+        unrated.genres.add(classic_fiction)
+        UserBook.objects.create(user=self.user, book=unrated)
+
+        # Rating 4 under "classics" plus the default weight 3 under its canonical name
+        with self.assertNumQueries(2):
+            context = _bulk_build_user_contexts([self.user.id])[self.user.id]
+        self.assertEqual(context["genre_weights"], Counter({"classic fiction": 7}))
+
+    def test_contexts_grouped_per_user_in_caller_order(self):
+        from core.services.user_similarity_service import _bulk_build_user_contexts
+
+        other = User.objects.create_user(username="ctxgroup", password="test123")
+        empty = User.objects.create_user(username="ctxempty", password="test123")
+        second = Book.objects.create(title="Ctx Second", author=self.book.author)
+        # Interleave the two users' rows so grouping can't rely on insertion order
+        UserBook.objects.create(user=other, book=second, user_rating=2)
+        UserBook.objects.create(user=self.user, book=second, is_top_book=True)
+        UserBook.objects.create(user=other, book=self.book)
+
+        contexts = _bulk_build_user_contexts([empty.id, other.id, self.user.id])
+
+        self.assertEqual(list(contexts), [empty.id, other.id, self.user.id])
+        self.assertEqual(contexts[self.user.id]["book_ids"], {self.book.id, second.id})
+        self.assertEqual(contexts[self.user.id]["top_book_ids"], {second.id})
+        self.assertEqual(contexts[other.id]["book_ratings"], {second.id: 2})
+        self.assertEqual(contexts[empty.id]["total_books"], 0)
+        self.assertEqual(contexts[empty.id]["user_id"], empty.id)
+        self.assertFalse(contexts[empty.id]["book_ids"])
+
+    def test_empty_contexts_match_builder_and_share_no_containers(self):
+        from core.services.user_similarity_service import _build_similarity_context, _empty_similarity_context
+
+        first, second = _empty_similarity_context(1), _empty_similarity_context(2)
+        self.assertEqual(first, _build_similarity_context(1, (), Counter()))
+        shared_containers = ("book_ids", "top_book_ids", "book_ratings", "genre_weights", "author_weights")
+        for key in (*shared_containers, "rating_dist", "decade_dist"):
+            self.assertIsNot(first[key], second[key])
+
+    def test_context_decade_distribution_weighted_by_rating(self):
+        from core.services.user_similarity_service import _bulk_build_user_contexts
+
+        nineties = Book.objects.create(title="Ctx Nineties", author=self.book.author, publish_year=1995)
+        UserBook.objects.create(user=self.user, book=nineties)
+
+        # Rating 4 for the 2001 book, default weight 3 for the unrated 1995 one
+        context = _bulk_build_user_contexts([self.user.id])[self.user.id]
+        self.assertEqual(context["decade_dist"], {2000: 4 / 7, 1990: 3 / 7})
+
+    def test_anonymized_similarity_without_context_reuses_cached_top_books(self):
+        from core.services.user_similarity_service import calculate_similarity_with_anonymized
+
+        UserBook.objects.filter(user=self.user).update(is_top_book=True)
+        self.user.userprofile.dna_data = {"top_genres": [["fantasy", 3]], "top_authors": [["Ctx Author", 2]]}
+        self.user.userprofile.save()
+        profile = AnonymizedReadingProfile(top_book_ids=[self.book.id], genre_distribution={"fantasy": 1})
+
+        user = self._load_users()[0]
+        first = calculate_similarity_with_anonymized(user, profile)
+        with self.assertNumQueries(0):
+            second = calculate_similarity_with_anonymized(user, profile)
+
+        self.assertEqual(first["top_overlap"], 1.0)
+        self.assertEqual(second, first)
+
 
 @override_settings(
     CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache-refactor-tests"}}
@@ -386,6 +743,23 @@ class AnonProfilesSampleTests(TestCase):
         cached = cache.get("anon_profiles_sample")
         self.assertIsNotNone(cached)
 
+    def test_samples_cache_ids_not_model_instances(self):
+        """Both candidate-pool samples store plain ids; rows are refetched on every read."""
+        from core.models import AnonymizedReadingProfile
+        from core.services.recommendation_service import _get_anonymized_profiles_sample, _get_public_users_sample
+
+        profile = AnonymizedReadingProfile.objects.create(
+            total_books_read=5, reader_type="Fantasy Fan", top_book_ids=[self.book1.id]
+        )
+
+        profiles = _get_anonymized_profiles_sample()
+        users = _get_public_users_sample()
+
+        self.assertEqual(cache.get("anon_profiles_sample"), [profile.id])
+        self.assertEqual(cache.get("public_users_for_recs_sample"), [self.user1.id])
+        self.assertEqual([p.id for p in profiles], [profile.id])
+        self.assertEqual([u.id for u in users], [self.user1.id])
+
 
 @override_settings(
     CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cache-refactor-tests"}}
@@ -284,6 +284,39 @@ class RecommendationCurrentlyReadingBoostTests(TestCase):
         self.assertEqual(boost, 0.0)
 
 
+    def test_resolve_currently_reading_batches_lookups(self):
+        """Authors, books and genres resolve in a fixed number of queries however many books there are."""
+        from core.services.recommendation_service import _resolve_currently_reading
+
+        other_author = Author.objects.create(name="Other Author")
+        other_book = Book.objects.create(title="Other Book", author=other_author)
+        other_book.genres.add(Genre.objects.create(name="horror"))
+
+        currently_reading = [
+            {"title": "Test Book", "author": "Test Author"},
+            {"title": "Other Book", "author": "Other Author"},
+            {"title": "Missing Book", "author": "Missing Author"},
+            {"title": "No Author"},
+        ]
+
+        # One author query, one book query, one genre prefetch
+        with self.assertNumQueries(3):
+            genres, author_ids = _resolve_currently_reading(currently_reading)
+
+        self.assertEqual(genres, {"fantasy", "horror"})
+        self.assertEqual(author_ids, {self.author.id, other_author.id})
+
+    def test_resolve_currently_reading_uses_supplied_author_map(self):
+        from core.services.recommendation_service import _resolve_currently_reading
+
+        genres, author_ids = _resolve_currently_reading(
+            [{"title": "Test Book", "author": "Test Author"}], authors_by_name={}
+        )
+
+        self.assertEqual(genres, {"fantasy"})
+        self.assertEqual(author_ids, set())
+
+
 class CoverUrlPriorityTests(TestCase):
     """Tests for the book.cover_url or _build_cover_url(isbn13) pattern in DNA generation."""
 
@@ -390,6 +390,50 @@ class BookEnrichmentIntegrationTests(TestCase):
         self.assertIn("fantasy", details["genres"])
         self.assertEqual(details["page_count"], 200)
 
+    def test_ol_search_doc_with_subjects_and_edition_fields_skips_work_call(self):
+        """A search hit carrying subjects and edition fields skips the work endpoint.
+
+        The ISBN and publisher still come from the cover edition: the search doc's lists span every edition.
+        """
+        from core.services.book_enrichment_service import OPEN_LIBRARY_SEARCH_FIELDS, _fetch_from_open_library
+
+        session = MagicMock()
+        search_response = MagicMock()
+        search_response.status_code = 200
+        search_response.raise_for_status = MagicMock()
+        search_response.json.return_value = {
+            "docs": [
+                {
+                    "key": "/works/OL123W",
+                    "cover_edition_key": "OL456M",
+                    "cover_i": 999,
+                    "subject": ["Fantasy"],
+                    "first_publish_year": 1954,
+                    "publisher": ["Allen & Unwin"],
+                    "number_of_pages_median": 423,
+                    "isbn": ["9780007525546", "9780261103252"],
+                }
+            ]
+        }
+        edition_response = MagicMock()
+        edition_response.status_code = 200
+        edition_response.json.return_value = {"isbn_13": ["9780261103252"], "publishers": ["HarperCollins"]}
+        session.get.side_effect = [search_response, edition_response]
+
+        with patch("core.services.book_enrichment_service.track_external_api_call"):
+            details, api_calls = _fetch_from_open_library(self.book, session)
+
+        # search + edition (for the ISBN and publisher); no work call
+        self.assertEqual(api_calls, 2)
+        self.assertFalse({"isbn", "publisher"} & set(OPEN_LIBRARY_SEARCH_FIELDS.split(",")))
+        self.assertEqual(session.get.call_args_list[0].kwargs["params"]["fields"], OPEN_LIBRARY_SEARCH_FIELDS)
+        self.assertEqual(session.get.call_args_list[1].args[0], "https://openlibrary.org/books/OL456M.json")
+        self.assertIn("fantasy", details["genres"])
+        self.assertEqual(details["publish_year"], 1954)
+        self.assertEqual(details["publisher"], "HarperCollins")
+        self.assertEqual(details["page_count"], 423)
+        self.assertEqual(details["isbn_13"], "9780261103252")
+
     @patch("core.services.book_enrichment_service._fetch_ratings_and_categories_from_google_books")
     @patch("core.services.book_enrichment_service._fetch_from_open_library")
     def test_enrich_book_sets_cover_url_from_cover_id(self, mock_ol, mock_gb):
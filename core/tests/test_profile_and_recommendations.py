@@ -329,6 +329,23 @@ class RecommendationsTestCase(TestCase):
         self.assertEqual(len(anon_session.book_ratings), 2)
         self.assertEqual(anon_session.book_ratings.get(self.book1.id), 5)
 
+    def test_anonymous_session_book_id_sets(self):
+        """read_book_ids/top_book_ids are frozensets built once per instance"""
+        from django.utils import timezone
+        from datetime import timedelta
+
+        anon_session = AnonymousUserSession.objects.create(
+            session_key="book_id_sets",
+            dna_data={},
+            books_data=[self.book1.id, self.book2.id],
+            top_books_data=[self.book1.id],
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+
+        self.assertEqual(anon_session.read_book_ids, frozenset({self.book1.id, self.book2.id}))
+        self.assertEqual(anon_session.top_book_ids, frozenset({self.book1.id}))
+        self.assertIs(anon_session.read_book_ids, anon_session.read_book_ids)
+
     def test_anonymous_user_recommendations_via_service(self):
         """Test anonymous recommendations service can be called (mocked to avoid hangs)"""
         # Create AnonymousUserSession
@@ -6,7 +6,7 @@ from unittest.mock import MagicMock, patch
 
 from django.contrib.auth.models import User
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from core.models import Book, Author, Genre, Publisher, UserBook
 from core.services.user_similarity_service import calculate_user_similarity, find_similar_users
 from core.services.recommendation_service import (
@@ -137,6 +137,33 @@ class RecommendationTestCase(TestCase):
         self.assertGreater(similarity["similarity_score"], 0)
         self.assertEqual(similarity["shared_books_count"], 1)
 
+    def test_user_similarity_reads_each_library_once(self):
+        """Both users' books are loaded in a single pass rather than once per component."""
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user2, book=self.book1, user_rating=4)
+
+        # One UserBook read plus one genre aggregate, shared by both users
+        with self.assertNumQueries(2):
+            similarity = calculate_user_similarity(self.user1, self.user2)
+
+        self.assertEqual(similarity["shared_books_count"], 1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_user_similarity_reuses_cached_contexts_until_library_changes(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user2, book=self.book1, user_rating=4)
+        calculate_user_similarity(self.user1, self.user2)
+
+        with self.assertNumQueries(0):
+            calculate_user_similarity(self.user1, self.user2)
+
+        UserBook.objects.create(user=self.user2, book=self.book2, user_rating=3)
+        similarity = calculate_user_similarity(self.user1, self.user2)
+        self.assertEqual(similarity["total_books_user2"], 2)
+
     def test_find_similar_users(self):
         """Test finding similar users"""
         # Create a shared book
@@ -159,6 +186,31 @@ class RecommendationTestCase(TestCase):
                 self.assertGreater(data["similarity_score"], 0.1)
         self.assertTrue(found_user1)
 
+    def test_find_similar_users_skips_hidden_readers_of_shared_books(self):
+        """Readers who opted out of recommendations never enter the shared-book shortlist."""
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user2, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user3, book=self.book1, user_rating=5)
+        self.user3.userprofile.visible_in_recommendations = False
+        self.user3.userprofile.save()
+
+        similar_users = find_similar_users(self.user2, top_n=5, min_similarity=0.0)
+
+        found = {user for user, _ in similar_users}
+        self.assertIn(self.user1, found)
+        self.assertNotIn(self.user3, found)
+
+    def test_find_similar_users_defers_candidate_dna(self):
+        """Candidates carry only the columns scoring reads, so cached results skip dna_data."""
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user2, book=self.book1, user_rating=5)
+
+        similar_users = find_similar_users(self.user2, top_n=5, min_similarity=0.0)
+
+        self.assertTrue(similar_users)
+        for similar_user, _ in similar_users:
+            self.assertIn("dna_data", similar_user.userprofile.get_deferred_fields())
+
     def test_top_books_calculation(self):
         """Test that top books are calculated correctly"""
         # Create multiple user books with different ratings
@@ -175,6 +227,17 @@ class RecommendationTestCase(TestCase):
         top_books_queried = UserBook.objects.filter(user=self.user1, is_top_book=True).order_by("top_book_position")
         self.assertTrue(all(ub.is_top_book for ub in top_books_queried))
 
+    def test_top_books_load_only_scored_columns(self):
+        """Top-book scoring loads ratings and reviews only, not whole rows with their books"""
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=5)
+        UserBook.objects.create(user=self.user1, book=self.book2, user_rating=3)
+
+        top_books = calculate_and_store_top_books(self.user1, limit=1)
+
+        self.assertEqual(len(top_books), 1)
+        self.assertIn("book_id", top_books[0].get_deferred_fields())
+        self.assertTrue(UserBook.objects.get(user=self.user1, book=self.book1).is_top_book)
+
     def test_top_books_rating_priority(self):
         """Test that books with higher ratings are prioritized"""
         # Create books with different ratings
@@ -189,6 +252,40 @@ class RecommendationTestCase(TestCase):
         top_book = UserBook.objects.get(user=self.user1, is_top_book=True, top_book_position=1)
         self.assertEqual(top_book.book, self.book1)
 
+    def test_top_books_stored_with_constant_queries(self):
+        """Top-book flags are written with one bulk UPDATE regardless of limit"""
+        for book, rating in ((self.book1, 5), (self.book2, 3), (self.book3, 4), (self.book4, 2)):
+            UserBook.objects.create(user=self.user1, book=book, user_rating=rating)
+
+        # select, reset and bulk update, plus the atomic block's savepoint and release
+        with self.assertNumQueries(5):
+            calculate_and_store_top_books(self.user1, limit=3)
+
+        positions = dict(
+            UserBook.objects.filter(user=self.user1, is_top_book=True).values_list("book_id", "top_book_position")
+        )
+        self.assertEqual(positions, {self.book1.id: 1, self.book3.id: 2, self.book2.id: 3})
+
+    def test_vectorized_top_book_scores_match_compute_book_score(self):
+        """The array scorer agrees with the canonical scalar compute_book_score"""
+        from core.services.top_books_service import _score_user_books, compute_book_score, review_sentiment
+
+        review = "An absolutely wonderful, moving book that I loved."
+        user_books = [
+            UserBook(user_rating=5),
+            UserBook(user_rating=4, user_review=review),
+            UserBook(user_rating=3),
+            UserBook(user_rating=1, user_review="too short"),
+            UserBook(user_rating=None),
+            UserBook(user_rating=None, user_review=review),
+        ]
+
+        expected = [
+            compute_book_score(ub.user_rating, review_sentiment(ub.user_review) if ub.user_review == review else None)
+            for ub in user_books
+        ]
+        self.assertEqual(_score_user_books(user_books).tolist(), expected)
+
     def test_get_recommendations_for_user(self):
         """Test recommendation generation for a user"""
         # User1 reads book1 and book2
@@ -303,6 +400,163 @@ class RecommendationTestCase(TestCase):
         top_book = UserBook.objects.get(user=self.user1, is_top_book=True, top_book_position=1)
         self.assertEqual(top_book.book, self.book1)
 
+    def test_anonymized_profile_candidates_carry_genre_names(self):
+        """Anonymized-profile candidates get genre names from one through-table query, not a prefetch"""
+        from core.models import AnonymizedReadingProfile
+        from core.services.recommendation_service import _collect_candidates_from_anonymized_profiles
+
+        profile = AnonymizedReadingProfile.objects.create(
+            total_books_read=10, reader_type="Fantasy Fan", top_book_ids=[self.book2.id, self.book3.id]
+        )
+        candidates = {}
+
+        with self.assertNumQueries(2):
+            _collect_candidates_from_anonymized_profiles([(profile, {"similarity_score": 0.5})], set(), candidates)
+
+        self.assertEqual(candidates[self.book2.id]["genre_names"], ["fantasy"])
+        self.assertEqual(candidates[self.book3.id]["genre_names"], ["science fiction"])
+
+    def test_user_genre_weights_aggregated_in_database(self):
+        """Top books weigh 5, rated books their rating, unrated books 3"""
+        from core.services.recommendation_service import _build_user_context
+
+        self.book1.genres.add(self.genre_fiction)
+        UserBook.objects.create(user=self.user1, book=self.book1, user_rating=2, is_top_book=True)
+        UserBook.objects.create(user=self.user1, book=self.book2, user_rating=4)
+        UserBook.objects.create(user=self.user1, book=self.book3)
+
+        preferences = _build_user_context(self.user1)["genre_preferences"]
+
+        # fantasy 5 + 4, literature 5, science fiction 3
+        self.assertAlmostEqual(preferences["fantasy"], 9 / 17)
+        self.assertAlmostEqual(preferences["literature"], 5 / 17)
+        self.assertAlmostEqual(preferences["science fiction"], 3 / 17)
+
+    def test_similar_user_candidates_carry_genre_names(self):
+        """Similar-user candidates get genre names up front, so scoring never touches book.genres"""
+        from core.services.recommendation_service import _collect_candidates_from_similar_users
+
+        UserBook.objects.create(user=self.user2, book=self.book2, user_rating=5)
+        UserBook.objects.create(user=self.user2, book=self.book3, user_rating=4)
+        candidates = {}
+
+        with self.assertNumQueries(2):
+            _collect_candidates_from_similar_users([(self.user2, {"similarity_score": 0.6})], set(), candidates)
+
+        self.assertEqual(candidates[self.book2.id]["genre_names"], ["fantasy"])
+        self.assertEqual(candidates[self.book3.id]["genre_names"], ["science fiction"])
+
+    def test_similar_user_candidates_filtered_in_query(self):
+        """Read books and books under the quality floor never come back from the candidate query"""
+        from core.services.recommendation_service import _collect_candidates_from_similar_users
+
+        low_rated = Book.objects.create(title="Poorly Rated", author=self.author2, average_rating=2.1)
+        unrated = Book.objects.create(title="Unrated", author=self.author3, average_rating=None)
+        for book in (self.book1, self.book2, low_rated, unrated):
+            UserBook.objects.create(user=self.user2, book=book, user_rating=5)
+        candidates = {}
+
+        _collect_candidates_from_similar_users([(self.user2, {"similarity_score": 0.6})], {self.book1.id}, candidates)
+
+        self.assertEqual(set(candidates), {self.book2.id, unrated.id})
+
+    def test_candidates_track_best_source_while_collecting(self):
+        """best_source is the highest-similarity source; the first one wins a tie"""
+        from core.services.recommendation_service import _collect_candidates_from_similar_users
+
+        for user in (self.user1, self.user2, self.user3):
+            UserBook.objects.create(user=user, book=self.book2, user_rating=5)
+        candidates = {}
+
+        _collect_candidates_from_similar_users(
+            [
+                (self.user1, {"similarity_score": 0.4}),
+                (self.user2, {"similarity_score": 0.7}),
+                (self.user3, {"similarity_score": 0.7}),
+            ],
+            set(),
+            candidates,
+        )
+
+        entry = candidates[self.book2.id]
+        self.assertEqual(entry["best_source"]["user_id"], self.user2.id)
+        self.assertIs(entry["best_source"], entry["sources"][1])
+
+    def test_anonymous_author_weights_use_stored_ratings(self):
+        """Ratings reloaded from the JSONField have string keys but still weight their author"""
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from core.models import AnonymousUserSession
+        from core.services.recommendation_service import _build_anonymous_context
+
+        AnonymousUserSession.objects.create(
+            session_key="author-weights",
+            dna_data={},
+            books_data=[self.book1.id, self.book2.id],
+            author_distribution={self.author1.normalized_name: 4, self.author2.normalized_name: 2},
+            book_ratings={self.book1.id: 5, self.book2.id: 2},
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+        anon_session = AnonymousUserSession.objects.get(session_key="author-weights")
+
+        author_weights = _build_anonymous_context(anon_session)["author_weights"]
+
+        self.assertAlmostEqual(author_weights[self.author1.id], 4.0)
+        self.assertAlmostEqual(author_weights[self.author2.id], 0.8)
+
+    def test_anonymous_similarity_matches_reloaded_ratings(self):
+        """String-keyed ratings from the JSONField still line up with a user's int book ids"""
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from core.models import AnonymousUserSession
+        from core.services.user_similarity_service import (
+            _build_user_context_for_similarity,
+            calculate_anonymous_similarity_with_context,
+        )
+
+        for book, rating in ((self.book1, 5), (self.book2, 3), (self.book4, 1)):
+            UserBook.objects.create(user=self.user1, book=book, user_rating=rating)
+        AnonymousUserSession.objects.create(
+            session_key="reloaded-ratings",
+            dna_data={},
+            books_data=[self.book1.id, self.book2.id, self.book4.id],
+            book_ratings={self.book1.id: 4, self.book2.id: 3, self.book4.id: 2},
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+        anon_session = AnonymousUserSession.objects.get(session_key="reloaded-ratings")
+
+        similarity = calculate_anonymous_similarity_with_context(
+            anon_session, _build_user_context_for_similarity(self.user1)
+        )
+
+        self.assertEqual(similarity["shared_rated_count"], 3)
+        self.assertIsNotNone(similarity["shared_correlation"])
+
+    def test_anonymous_context_reads_books_once_when_ids_are_stale(self):
+        """Book ids that no longer exist are not refetched a second time for author weighting"""
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from core.models import AnonymousUserSession
+        from core.services.recommendation_service import _build_anonymous_context
+
+        anon_session = AnonymousUserSession.objects.create(
+            session_key="stale-books",
+            dna_data={},
+            books_data=[999991, 999992],
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+
+        with self.assertNumQueries(1):
+            context = _build_anonymous_context(anon_session)
+
+        self.assertEqual(context["author_weights"], {})
+
 
 class PrivacyTestCase(TestCase):
     """Test privacy and visibility features"""
@@ -473,6 +727,111 @@ class GlobalPopularityFallbackTestCase(TestCase):
         self.assertNotIn(low_book.id, fallback_ids)
 
 
+class PreferenceFallbackTestCase(TestCase):
+    """Favorite-author and favorite-genre fallbacks each run as a single query."""
+
+    def setUp(self):
+        self.author1 = Author.objects.create(name="Fallback Author 1")
+        self.author2 = Author.objects.create(name="Fallback Author 2")
+        self.genre_a = Genre.objects.create(name="mystery")
+        self.genre_b = Genre.objects.create(name="horror")
+
+        self.author1_books = [
+            Book.objects.create(title=f"Author One Book {i}", author=self.author1, average_rating=4.2) for i in range(5)
+        ]
+        self.author2_books = [
+            Book.objects.create(title=f"Author Two Book {i}", author=self.author2, average_rating=4.2) for i in range(2)
+        ]
+
+        self.mystery_books = []
+        for i in range(7):
+            book = Book.objects.create(
+                title=f"Mystery {i}",
+                author=Author.objects.create(name=f"Mystery Author {i}"),
+                average_rating=4.0 + i / 10,
+            )
+            book.genres.add(self.genre_a)
+            self.mystery_books.append(book)
+
+        self.horror_book = Book.objects.create(
+            title="Horror", author=Author.objects.create(name="Horror Author"), average_rating=4.1
+        )
+        self.horror_book.genres.add(self.genre_b, self.genre_a)
+
+    def _context(self, **overrides):
+        from collections import Counter
+
+        context = {
+            "read_book_ids": set(),
+            "author_weights": Counter(),
+            "author_saturation": {},
+            "genre_preferences": {},
+        }
+        context.update(overrides)
+        return context
+
+    def test_author_fallback_caps_three_books_per_author(self):
+        from collections import Counter
+
+        from core.services.recommendation_service import _get_fallback_candidates
+
+        context = self._context(author_weights=Counter({self.author1.id: 5, self.author2.id: 3}))
+        # One author query plus its genre prefetch; the limit is met before the later strategies
+        with self.assertNumQueries(2):
+            candidates = _get_fallback_candidates(context, limit=5)
+
+        author_sourced = [c for c in candidates.values() if c["sources"][0]["type"] == "fallback_author"]
+        author1_count = sum(1 for c in author_sourced if c["book"].author_id == self.author1.id)
+        author2_count = sum(1 for c in author_sourced if c["book"].author_id == self.author2.id)
+        self.assertEqual((author1_count, author2_count), (3, 2))
+
+    def test_author_fallback_prefers_best_rated_books(self):
+        from collections import Counter
+
+        from core.services.recommendation_service import _get_fallback_candidates
+
+        for rating, book in zip([3.9, 4.8, 4.0, 4.6, 4.5], self.author1_books):
+            book.average_rating = rating
+            book.save(update_fields=["average_rating"])
+
+        context = self._context(author_weights=Counter({self.author1.id: 5}))
+        candidates = _get_fallback_candidates(context, limit=3)
+
+        expected = {self.author1_books[1].id, self.author1_books[3].id, self.author1_books[4].id}
+        self.assertEqual(set(candidates), expected)
+
+    def test_registered_user_fallback_excludes_library_in_sql(self):
+        from collections import Counter
+
+        from core.services.recommendation_service import _get_fallback_candidates
+
+        reader = User.objects.create_user(username="fallback_reader", password="pw")
+        UserBook.objects.create(user=reader, book=self.author1_books[0], user_rating=5)
+
+        # read_book_ids is left empty on purpose: the user's UserBook rows drive the exclusion
+        context = self._context(user=reader, author_weights=Counter({self.author1.id: 5}))
+        candidates = _get_fallback_candidates(context, limit=3)
+
+        self.assertEqual(len(candidates), 3)
+        self.assertNotIn(self.author1_books[0].id, candidates)
+
+    def test_genre_fallback_takes_top_five_per_genre(self):
+        from core.services.recommendation_service import _get_fallback_candidates
+
+        context = self._context(genre_preferences={"mystery": 0.7, "horror": 0.3, "missing genre": 0.1})
+        candidates = _get_fallback_candidates(context, limit=6)
+
+        genre_sourced = {
+            book_id: c["sources"][0]["reason"]
+            for book_id, c in candidates.items()
+            if c["sources"][0]["type"] == "fallback_genre"
+        }
+        top_mystery = {b.id for b in sorted(self.mystery_books, key=lambda b: -b.average_rating)[:5]}
+        self.assertTrue(top_mystery <= set(genre_sourced))
+        self.assertEqual(genre_sourced[self.horror_book.id], "Popular horror book")
+        self.assertEqual(candidates[self.horror_book.id]["genre_names"], ["mystery", "horror"])
+
+
 class EmptyStateRecommendationsViewTestCase(TestCase):
     """Test that the empty-state UI shows when there are no recommendations."""
 
@@ -670,3 +1029,438 @@ class EmptyStateRecommendationsViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Public New Shape")
         self.assertContains(response, "Public Legacy Shape")
+
+
+class SeriesKeyTestCase(TestCase):
+    """Test series key extraction used for series-saturation filtering"""
+
+    def test_series_indicators_are_stripped(self):
+        from core.services.recommendation_service import _get_series_key
+
+        self.assertEqual(_get_series_key("Mistborn: The Final Empire"), "mistborn")
+        self.assertEqual(_get_series_key("The Wheel of Time Book 3"), "wheel time")
+        self.assertEqual(_get_series_key("Dune Messiah VOLUME 2"), "dune messiah")
+        self.assertEqual(_get_series_key("Saga #2: Part Two"), "saga")
+
+    def test_titles_without_significant_words(self):
+        from core.services.recommendation_service import _get_series_key
+
+        self.assertIsNone(_get_series_key(""))
+        self.assertIsNone(_get_series_key(None))
+        self.assertIsNone(_get_series_key("It"))
+
+    def test_series_key_is_memoized_per_title(self):
+        from core.services.recommendation_service import _get_series_key
+
+        _get_series_key.cache_clear()
+        _get_series_key("Mistborn: The Final Empire")
+        _get_series_key("Mistborn: The Final Empire")
+
+        self.assertEqual(_get_series_key.cache_info().hits, 1)
+
+
+class GenreAlignmentTestCase(TestCase):
+    """Test the batched genre alignment used when scoring candidates"""
+
+    def test_alignment_scores(self):
+        from core.services.recommendation_service import _calculate_genre_alignments
+
+        context = {"genre_preferences": {"fantasy": 0.6, "science fiction": 0.2}}
+        alignments = _calculate_genre_alignments(
+            {1: ["fantasy"], 2: ["science fiction", "horror"], 3: [], 4: ["fantasy", "fantasy"], 5: ["horror"]},
+            context,
+        )
+
+        self.assertEqual(alignments[1], 1.0)  # 0.6 * 2 capped at 1.0
+        self.assertAlmostEqual(alignments[2], 0.4)
+        self.assertEqual(alignments[3], 0.3)  # no genre data
+        self.assertEqual(alignments[4], 1.0)  # duplicate genres count once
+        self.assertEqual(alignments[5], 0.0)  # genre data, but no overlap with preferences
+
+    def test_neutral_without_preferences(self):
+        from core.services.recommendation_service import _calculate_genre_alignments
+
+        self.assertEqual(_calculate_genre_alignments({1: ["fantasy"]}, {"genre_preferences": {}}), {1: 0.5})
+        self.assertEqual(_calculate_genre_alignments({}, {"genre_preferences": {"fantasy": 1.0}}), {})
+
+    def test_genre_names_by_book_are_sorted(self):
+        """Explanations quote the first genres, so their order must not depend on the query plan"""
+        from core.services.recommendation_service import _get_genre_names_by_book
+
+        book = Book.objects.create(title="Ordered", author=Author.objects.create(name="Order Author"))
+        for name in ("thriller", "fantasy", "mystery"):
+            book.genres.add(Genre.objects.create(name=name))
+
+        self.assertEqual(_get_genre_names_by_book([book.id])[book.id], ["fantasy", "mystery", "thriller"])
+
+
+class DiversityFilterTestCase(TestCase):
+    """Genre/author caps in _apply_diversity_filter apply to the second half of the list"""
+
+    def _candidate(self, book_id, author, genres, score):
+        return {"book": Book(id=book_id, title=f"Book {book_id}", author=author), "genre_names": genres, "score": score}
+
+    def test_caps_apply_after_first_half_unless_score_is_exceptional(self):
+        from core.services.recommendation_service import _apply_diversity_filter
+
+        author_a, author_b = Author(id=1, name="A"), Author(id=2, name="B")
+        ranked = [
+            self._candidate(1, author_a, ["fantasy"], 10.0),
+            self._candidate(2, author_a, ["fantasy"], 9.0),
+            self._candidate(3, author_b, ["fantasy"], 8.5),
+            self._candidate(4, author_a, ["horror"], 8.2),  # third by author A, still within 80% of top
+            self._candidate(5, author_b, ["fantasy"], 5.0),  # fourth fantasy, below the bypass score
+            self._candidate(6, author_b, ["horror"], 4.0),
+        ]
+
+        final = _apply_diversity_filter(ranked, {}, limit=5)
+
+        self.assertEqual([c["book"].id for c in final], [1, 2, 3, 4, 6])
+
+
+class ScoreRankingTopKTestCase(TestCase):
+    """_score_and_rank_candidates with top_k returns the head of the fully sorted ranking"""
+
+    def test_top_k_matches_full_sort_prefix(self):
+        from core.services.recommendation_service import _score_and_rank_candidates
+
+        author = Author.objects.create(name="Ranking Author")
+        candidates = {}
+        for i in range(12):
+            book = Book.objects.create(title=f"Ranked {i}", author=author, average_rating=3.6 + (i % 5) / 10)
+            source = {"type": "similar_user", "user": None, "similarity": 0.5}
+            candidates[book.id] = {
+                "book": book,
+                "genre_names": [],
+                "sources": [source],
+                "best_source": source,
+                "max_similarity": 0.5,
+                "recommender_count": 1 + i % 3,
+                "total_weight": 0.1 * (i % 4),
+            }
+        context = {
+            "read_book_ids": frozenset(),
+            "disliked_book_ids": frozenset(),
+            "oversaturated_series": frozenset(),
+            "author_saturation": {},
+            "genre_preferences": {},
+        }
+
+        full = _score_and_rank_candidates(candidates, context)
+        top = _score_and_rank_candidates(candidates, context, top_k=4)
+
+        self.assertEqual([c["book"].id for c in top], [c["book"].id for c in full[:4]])
+        self.assertEqual(len(_score_and_rank_candidates(candidates, context, top_k=50)), 12)
+
+
+class RecencyFactorTestCase(TestCase):
+    """Age buckets for _calculate_recency_factor"""
+
+    def test_age_buckets(self):
+        from core.services.recommendation_service import _calculate_recency_factor
+
+        expected = {2031: 0.15, 2030: 0.15, 2027: 0.15, 2026: 0.1, 2020: 0.1, 2019: 0.05, 2010: 0.05, 2009: 0}
+        for publish_year, boost in expected.items():
+            book = Book(title="Recency", publish_year=publish_year)
+            self.assertEqual(_calculate_recency_factor(book, current_year=2030), boost, publish_year)
+
+    def test_unknown_year(self):
+        from core.services.recommendation_service import _calculate_recency_factor
+
+        self.assertEqual(_calculate_recency_factor(Book(title="Undated"), current_year=2030), 0)
+
+
+class BookIdBitsetTestCase(TestCase):
+    """Test the bitmap used to drop read/disliked candidates"""
+
+    def test_membership(self):
+        import numpy as np
+
+        from core.services.recommendation_service import _bitset_contains, _build_book_id_bitset
+
+        bitset = _build_book_id_bitset({1, 8, 9, 63})
+        probe = np.array([0, 1, 7, 8, 9, 63, 64, 10_000], dtype=np.int64)
+
+        self.assertEqual(_bitset_contains(bitset, probe).tolist(), [False, True, False, True, True, True, False, False])
+
+    def test_empty_bitset(self):
+        import numpy as np
+
+        from core.services.recommendation_service import _bitset_contains, _build_book_id_bitset
+
+        bitset = _build_book_id_bitset(set())
+        self.assertEqual(_bitset_contains(bitset, np.array([1, 2], dtype=np.int64)).tolist(), [False, False])
+
+
+class TopKOrderTestCase(TestCase):
+    """_top_k_order matches the head of a stable descending argsort"""
+
+    def test_matches_stable_sort_with_ties(self):
+        import numpy as np
+
+        from core.services.recommendation_service import _top_k_order
+
+        scores = np.array([1.0, 3.0, 2.0, 3.0, 2.0, 0.5, 2.0])
+        full = np.argsort(-scores, kind="stable").tolist()
+
+        self.assertEqual(_top_k_order(scores).tolist(), full)
+        for k in range(len(scores) + 2):
+            self.assertEqual(_top_k_order(scores, k).tolist(), full[:k], k)
+
+
+class SharedRatingCorrelationTestCase(TestCase):
+    """Pearson correlation over shared rated books, rescaled to 0-1"""
+
+    def test_matches_numpy_pearson(self):
+        import numpy as np
+
+        from core.services.user_similarity_service import _shared_rating_correlation
+
+        ratings1 = {1: 5, 2: 3, 3: 4, 4: 1, 5: 2}
+        ratings2 = {1: 4, 2: 2, 3: 5, 4: 2, 5: 1, 6: 5}
+        shared = set(ratings1) & set(ratings2)
+
+        expected = (np.corrcoef([ratings1[b] for b in shared], [ratings2[b] for b in shared])[0, 1] + 1) / 2
+        self.assertAlmostEqual(_shared_rating_correlation(ratings1, ratings2, shared), expected)
+
+    def test_no_variance_returns_none(self):
+        from core.services.user_similarity_service import _shared_rating_correlation
+
+        self.assertIsNone(_shared_rating_correlation({1: 4, 2: 4, 3: 4}, {1: 1, 2: 5, 3: 3}, {1, 2, 3}))
+
+    def test_shared_book_correlation_needs_three_shared_ratings(self):
+        from core.services.user_similarity_service import _shared_book_correlation
+
+        self.assertEqual(_shared_book_correlation({1: 5, 2: 3}, {1: 4, 2: 2, 3: 5}), (None, 0))
+        self.assertEqual(_shared_book_correlation({1: 5, 2: 3, 4: 1}, {1: 4, 2: 2, 3: 5}), (None, 2))
+
+        correlation, shared_count = _shared_book_correlation({1: 5, 2: 3, 3: 1}, {1: 4, 2: 2, 3: 1, 4: 5})
+        self.assertEqual(shared_count, 3)
+        self.assertGreater(correlation, 0.5)
+
+
+class RatingPatternSimilarityTestCase(TestCase):
+    """Rating-pattern similarity blends histogram overlap (70%) with average-rating closeness (30%)"""
+
+    def _context(self, rating_dist):
+        from core.services.user_similarity_service import _rating_profile
+
+        shares, mean = _rating_profile(rating_dist)
+        return {"rating_shares": shares, "rating_mean": mean}
+
+    def test_matches_hand_computed_value(self):
+        from collections import Counter
+
+        from core.services.user_similarity_service import _calculate_rating_pattern_similarity_from_context
+
+        ctx1 = self._context(Counter({5: 2, 4: 2}))
+        ctx2 = self._context(Counter({5: 1, 3: 3}))
+
+        # Proportions [0, 0, 0, .5, .5] vs [0, 0, .75, 0, .25] -> TVD 0.75; averages 4.5 vs 3.5
+        expected = (1 - 0.75) * 0.7 + (1 - 1.0 / 4.0) * 0.3
+        self.assertAlmostEqual(_calculate_rating_pattern_similarity_from_context(ctx1, ctx2), expected)
+
+    def test_identical_distributions_score_one(self):
+        from collections import Counter
+
+        from core.services.user_similarity_service import _calculate_rating_pattern_similarity_from_context
+
+        ctx = self._context(Counter({1: 1, 3: 2, 5: 4}))
+        self.assertAlmostEqual(_calculate_rating_pattern_similarity_from_context(ctx, ctx), 1.0)
+
+    def test_batch_matches_pairwise(self):
+        from collections import Counter
+
+        from core.services.user_similarity_service import (
+            _batch_rating_pattern_similarities,
+            _calculate_rating_pattern_similarity_from_context,
+        )
+
+        target = self._context(Counter({4: 3, 5: 1}))
+        contexts = [
+            self._context(Counter({1: 2, 2: 1})),
+            self._context(Counter()),
+            self._context(Counter({4: 1, 5: 3})),
+        ]
+
+        batched = _batch_rating_pattern_similarities(target, contexts)
+
+        for score, ctx in zip(batched, contexts):
+            self.assertAlmostEqual(score, _calculate_rating_pattern_similarity_from_context(target, ctx))
+        self.assertEqual(batched[1], 0.5)
+
+
+class BatchEraSimilarityTestCase(TestCase):
+    """Batched publication-era similarity matches the pairwise L1 over decade shares"""
+
+    def test_batch_matches_pairwise(self):
+        from core.services.user_similarity_service import (
+            _batch_era_similarities,
+            _calculate_reading_era_similarity_from_context,
+            _decade_distribution,
+        )
+
+        def context(decade_weights):
+            return {"decade_dist": _decade_distribution(decade_weights) if decade_weights else {}}
+
+        target = context({1990: 3, 2010: 5})
+        contexts = [
+            context({1990: 1, 2000: 4}),
+            context({}),
+            context({1950: 2}),
+            context({1990: 3, 2010: 5}),
+        ]
+
+        batched = _batch_era_similarities(target, contexts)
+
+        for score, ctx in zip(batched, contexts):
+            self.assertAlmostEqual(score, _calculate_reading_era_similarity_from_context(target, ctx))
+        self.assertEqual(batched[1], 0.5)
+        self.assertAlmostEqual(batched[2], 0.0)
+        self.assertEqual(_batch_era_similarities(context({}), contexts).tolist(), [0.5] * 4)
+
+
+class BatchCosineSimilarityTestCase(TestCase):
+    """_batch_cosine_similarities agrees with the pairwise _calculate_cosine_similarity"""
+
+    def test_matches_pairwise(self):
+        from collections import Counter
+
+        from core.services.user_similarity_service import (
+            _batch_cosine_similarities,
+            _calculate_cosine_similarity,
+            _counter_norm,
+        )
+
+        target = Counter({"fantasy": 6, "horror": 2, "romance": 1})
+        others = [
+            Counter({"fantasy": 3, "science fiction": 4}),
+            Counter({"history": 5}),  # no shared keys
+            Counter(),
+            Counter({"horror": 2, "romance": 1, "fantasy": 6}),
+        ]
+
+        batched = _batch_cosine_similarities(target, others).tolist()
+        with_norms = _batch_cosine_similarities(target, others, [_counter_norm(other) for other in others]).tolist()
+
+        for similarity, cached_norm_similarity, other in zip(batched, with_norms, others):
+            self.assertAlmostEqual(similarity, _calculate_cosine_similarity(target, other))
+            self.assertAlmostEqual(cached_norm_similarity, similarity)
+
+    def test_large_counts_match_pairwise(self):
+        """The float32 projection stays exact for the integer weights a large library produces."""
+        from collections import Counter
+
+        from core.services.user_similarity_service import _batch_cosine_similarities, _calculate_cosine_similarity
+
+        target = Counter({"fantasy": 2417, "horror": 388, "romance": 1093})
+        others = [Counter({"fantasy": 1999, "horror": 7, "poetry": 4021}), Counter({"romance": 3})]
+
+        for similarity, other in zip(_batch_cosine_similarities(target, others).tolist(), others):
+            self.assertAlmostEqual(similarity, _calculate_cosine_similarity(target, other), places=9)
+
+    def test_pairwise_cosine_uses_shared_keys_only(self):
+        import math
+        from collections import Counter
+
+        from core.services.user_similarity_service import _calculate_cosine_similarity
+
+        small = Counter({"fantasy": 1, "horror": 1})
+        large = Counter({"fantasy": 1, "history": 2, "poetry": 2})
+
+        self.assertAlmostEqual(_calculate_cosine_similarity(small, large), 1 / (math.sqrt(2) * 3))
+        self.assertAlmostEqual(_calculate_cosine_similarity(large, small), 1 / (math.sqrt(2) * 3))
+        self.assertEqual(_calculate_cosine_similarity(Counter(), large), 0)
+
+    def test_empty_target(self):
+        from collections import Counter
+
+        from core.services.user_similarity_service import _batch_cosine_similarities
+
+        self.assertEqual(_batch_cosine_similarities(Counter(), [Counter({"fantasy": 1})]).tolist(), [0.0])
+
+    def test_batched_anonymous_similarities_match_per_pair(self):
+        from collections import Counter
+
+        from core.models import AnonymousUserSession
+        from core.services.user_similarity_service import (
+            _counter_norm,
+            calculate_anonymous_similarities_with_contexts,
+            calculate_anonymous_similarity_with_context,
+        )
+
+        session = AnonymousUserSession(
+            session_key="batch-cosine",
+            books_data=[1, 2, 3],
+            top_books_data=[1],
+            genre_distribution={"fantasy": 4, "classics": 2},
+            author_distribution={"tolkien, j.r.r.": 3},
+            book_ratings={},
+        )
+        contexts = [
+            {
+                "book_ids": {1, 4},
+                "book_ratings": {},
+                "top_book_ids": {1},
+                "genre_weights": Counter({"fantasy": 5, "classic fiction": 1}),
+                "author_weights": Counter({"tolkien, j.r.r.": 2, "le guin, ursula": 4}),
+            },
+            {
+                "book_ids": {9},
+                "book_ratings": {},
+                "top_book_ids": set(),
+                "genre_weights": Counter(),
+                "author_weights": Counter({"martin, george": 1}),
+            },
+        ]
+
+        for context in contexts:
+            context["genre_norm"] = _counter_norm(context["genre_weights"])
+            context["author_norm"] = _counter_norm(context["author_weights"])
+
+        batched = calculate_anonymous_similarities_with_contexts(session, contexts)
+
+        for result, context in zip(batched, contexts):
+            expected = calculate_anonymous_similarity_with_context(session, context)
+            self.assertAlmostEqual(result["similarity_score"], expected["similarity_score"])
+            self.assertAlmostEqual(result["genre_similarity"], expected["genre_similarity"])
+
+    def test_batched_anonymized_profile_similarities_match_cosines(self):
+        from collections import Counter
+
+        from core.models import AnonymizedReadingProfile, AnonymousUserSession
+        from core.services.user_similarity_service import (
+            _calculate_cosine_similarity,
+            _canonicalize_genre_counter,
+            calculate_similarities_with_anonymized,
+        )
+
+        session = AnonymousUserSession(
+            session_key="batch-anonymized",
+            top_books_data=[1, 2],
+            genre_distribution={"fantasy": 4, "classics": 2},
+            author_distribution={"tolkien, j.r.r.": 3, "le guin, ursula": 1},
+        )
+        profiles = [
+            AnonymizedReadingProfile(
+                top_book_ids=[2, 7],
+                genre_distribution={"classic fiction": 3, "horror": 1},
+                author_distribution={"le guin, ursula": 5},
+            ),
+            AnonymizedReadingProfile(top_book_ids=[], genre_distribution={}, author_distribution={}),
+        ]
+
+        results = calculate_similarities_with_anonymized(session, profiles)
+
+        session_genres = _canonicalize_genre_counter(session.genre_distribution)
+        for result, profile in zip(results, profiles):
+            genre_similarity = _calculate_cosine_similarity(
+                session_genres, _canonicalize_genre_counter(profile.genre_distribution)
+            )
+            author_similarity = _calculate_cosine_similarity(
+                Counter(session.author_distribution), Counter(profile.author_distribution)
+            )
+            self.assertAlmostEqual(result["genre_similarity"], genre_similarity)
+            self.assertAlmostEqual(result["author_similarity"], author_similarity)
+        self.assertEqual(results[0]["top_overlap"], 0.5)
+        self.assertEqual(results[1]["similarity_score"], 0)
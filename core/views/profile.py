@@ -16,7 +16,7 @@ from django_ratelimit.decorators import ratelimit
 from django_ratelimit.exceptions import Ratelimited
 
 from ..analytics.events import track_account_deleted, track_profile_made_public, track_settings_updated
-from ..cache_utils import safe_cache_delete
+from ..cache_utils import bump_user_version, safe_cache_delete
 from ..forms import ChangePasswordForm, UpdateDisplayNameForm
 
 logger = logging.getLogger(__name__)
@@ -50,6 +50,8 @@ def update_privacy_view(request):
         safe_cache_delete(f"user_recommendations_{request.user.id}")
         safe_cache_delete(f"similar_users_{request.user.id}")
         safe_cache_delete("public_users_for_recs_sample")
+        # Stales every cached similar-user list that names this user
+        bump_user_version(request.user.id)
         logger.info(
             "profile set private; cleared recs caches",
             extra={"user_id": request.user.id},
@@ -142,6 +144,9 @@ def update_recommendation_visibility(request):
 
     safe_cache_delete(f"user_recommendations_{request.user.id}")
     safe_cache_delete(f"similar_users_{request.user.id}")
+    if was_visible != is_visible:
+        # Leaving the pool stales every cached similar-user list that names this user
+        bump_user_version(request.user.id)
 
     if was_visible and not is_visible:
         # Opting out removes the user from the shared candidate sample AND the pool count
@@ -230,6 +235,8 @@ def _delete_account_view_throttled(request):
     track_account_deleted(uid)
     # Drop the recs candidate sample so the deleted user can't linger in it.
     safe_cache_delete("public_users_for_recs_sample")
+    # ...and out of any other reader's cached similar-user list
+    bump_user_version(uid)
     logout(request)
     User.objects.filter(pk=uid).delete()
 